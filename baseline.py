@@ -0,0 +1,153 @@
+import numpy as np
+
+from stages import baseline_shift, zero_lag_moving_average
+from streaming import StreamingMAV
+
+# Baseline windows: long enough to keep the QRS (ECG) or a breath (RESP) out
+# of the estimate, short enough to follow wander within a Holter day
+ECG_BASELINE_WINDOW = 1.0
+RESP_BASELINE_WINDOW = 15.0
+MAVG_PASSES = 3
+methods = ('median', 'mavg', 'poly')
+
+
+# ===== Local baseline ===== #
+# 'median': percentile of consecutive blocks of window_s seconds, linearly
+#           interpolated between block centres (flat before the first and
+#           after the last centre)
+# 'mavg':   `passes` cascaded zero-lag moving averages of window_s seconds
+# Both are O(N), work along the last axis and match StreamingBaseline.
+def _block_size(fs, window_s):
+    return max(1, int(round(window_s * fs)))
+
+
+def _block_centers(n, block):
+    starts = np.arange(0, n, block)
+    lengths = np.minimum(block, n - starts)
+    return starts + (lengths - 1) / 2
+
+
+def _block_percentile(x, block, q):
+    n = x.shape[-1]
+    n_full = n // block
+    parts = []
+    if n_full:
+        full = x[..., :n_full * block].reshape(x.shape[:-1] + (n_full, block))
+        parts.append(np.percentile(full, q, axis=-1))
+    if n % block:
+        parts.append(np.percentile(x[..., n_full * block:], q, axis=-1)[..., np.newaxis])
+    return np.concatenate(parts, axis=-1)
+
+
+def local_baseline(signal, fs=125, window_s=ECG_BASELINE_WINDOW, method='median',
+                   q=50, passes=MAVG_PASSES):
+    x = np.asarray(signal, dtype=np.float64)
+    if method == 'median':
+        block = _block_size(fs, window_s)
+        centers = _block_centers(x.shape[-1], block)
+        levels = _block_percentile(x, block, q)
+        idx = np.arange(x.shape[-1])
+        if x.ndim == 1:
+            return np.interp(idx, centers, levels)
+        flat = levels.reshape(-1, len(centers))
+        out = np.stack([np.interp(idx, centers, row) for row in flat])
+        return out.reshape(x.shape)
+    if method == 'mavg':
+        window = _block_size(fs, window_s)
+        trend = x
+        for _ in range(passes):
+            trend = zero_lag_moving_average(trend, window)
+        return trend
+    raise ValueError(f"Unknown baseline method: {method}")
+
+
+# Baseline-corrected signal; method='poly' keeps the old whole-record fit
+def remove_baseline(signal, fs=125, window_s=ECG_BASELINE_WINDOW, method='median', degree=2,
+                    **kwargs):
+    signal = np.asarray(signal, dtype=np.float64)
+    if method == 'poly':
+        return baseline_shift(signal, degree)
+    return signal - local_baseline(signal, fs, window_s, method, **kwargs)
+
+
+# ===== Streaming baseline ===== #
+# Same estimate block by block for one channel, with the process()/flush()
+# interface of the streaming stages. Output lags the input by `latency`
+# samples (1.5 blocks for 'median', the summed half windows for 'mavg').
+class StreamingBaseline:
+    def __init__(self, fs=125, window_s=ECG_BASELINE_WINDOW, method='median', q=50,
+                 passes=MAVG_PASSES):
+        if method not in ('median', 'mavg'):
+            raise ValueError(f"Unknown streaming baseline method: {method}")
+        self.method = method
+        self.q = q
+        if method == 'median':
+            self.block = _block_size(fs, window_s)
+            self.latency = self.block + self.block // 2
+            self._pending = np.zeros(0)
+            self._next = 0          # index of the first pending sample
+            self._block_start = 0
+            self._prev = None       # (center, level) of the previous block
+        else:
+            self.stages = [StreamingMAV(_block_size(fs, window_s)) for _ in range(passes)]
+            self.latency = sum(m.latency for m in self.stages)
+            self._delay = np.zeros(0)
+
+    # --- median ---
+    def _emit_until(self, center, level):
+        stop = int(np.floor(center)) + 1
+        count = stop - self._next
+        idx = np.arange(self._next, stop)
+        if self._prev is None:
+            base = np.full(count, level)
+        else:
+            base = np.interp(idx, [self._prev[0], center], [self._prev[1], level])
+        out = self._pending[:count] - base
+        self._pending = self._pending[count:]
+        self._next = stop
+        self._prev = (center, level)
+        return out
+
+    def _median_blocks(self, final):
+        outs = []
+        while True:
+            offset = self._block_start - self._next
+            available = len(self._pending) - offset
+            if available < self.block and not (final and available > 0):
+                break
+            length = min(self.block, available)
+            seg = self._pending[offset:offset + length]
+            level = np.percentile(seg, self.q)
+            center = self._block_start + (length - 1) / 2
+            self._block_start += length
+            outs.append(self._emit_until(center, level))
+        if final and len(self._pending):
+            # flat after the last centre
+            outs.append(self._pending - self._prev[1])
+            self._next += len(self._pending)
+            self._pending = np.zeros(0)
+        return np.concatenate(outs) if outs else np.zeros(0)
+
+    # --- mavg ---
+    def _cascade(self, block, final):
+        trend = block
+        for m in self.stages:
+            trend = m.process(trend)
+            if final:
+                trend = np.concatenate([trend, m.flush()])
+        out = self._delay[:len(trend)] - trend
+        self._delay = self._delay[len(trend):]
+        return out
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if self.method == 'median':
+            self._pending = np.concatenate([self._pending, block])
+            return self._median_blocks(final=False)
+        self._delay = np.concatenate([self._delay, block])
+        return self._cascade(block, final=False)
+
+    def flush(self):
+        if self.method == 'median':
+            return self._median_blocks(final=True)
+        return self._cascade(np.zeros(0), final=True)
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from baseline import ECG_BASELINE_WINDOW, methods as baseline_methods, remove_baseline
+from beats import BeatSeries
+from freqresp import qrs_scale
+from instrument import Profiler
+from quality import assess, beats_across_gaps, excluded_spans, gated_peaks
+from resample import refine_peaks, resample
+from stages import DEFAULT_WINDOW_SIZE, THRESHOLD_VALUE, detect_r_peaks
+from store import is_store, open_recording
+
+summary_columns = ['file', 'size', 'mtime_ns', 'params', 'lead', 'fs', 'n_samples', 'n_beats',
+                   'mean_rr', 'bpm', 'rr_intervals', 'excluded_s', 'seconds', 'error']
+CHECKPOINT_EVERY = 50
+
+
+# ===== Per-file chain ===== #
+# load -> baseline -> DWT -> abs -> MAV -> threshold -> RR; runs in a worker
+# process and only needs numpy/pandas. scale=None picks the QRS scale for fs.
+# profile=True adds the per-stage records under row['profile'] (not a
+# summary column). `path` may also be a store directory (store.py).
+# analysis_fs resamples other-rate recordings before the chain; RR then
+# comes from the R waves refined on the source-rate lead. beats_dir saves
+# each file's beat series (beats.BeatSeries) as <name>.beats.npz there.
+# gate=True detects only on the windows that pass quality.assess(); RR
+# intervals across an excluded span are dropped and excluded_s reports
+# how much of the record was skipped.
+def process_file(path, lead='II', fs=None, baseline='median', degree=2, scale=None,
+                 window_size=DEFAULT_WINDOW_SIZE, threshold_value=THRESHOLD_VALUE, profile=False,
+                 analysis_fs=None, beats_dir=None, gate=False):
+    st = os.stat(path)
+    row = {'file': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+           'lead': lead, 'error': ''}
+    prof = Profiler(enabled=profile)
+    start = time.perf_counter()
+    try:
+        with prof.stage('load') as stage:
+            rec = open_recording(path, channels=[lead])
+            stage.output(rec[lead])
+        fs = fs or rec.fs
+        if not fs:
+            raise ValueError("cannot determine sampling rate; pass --fs")
+        signal, work_fs = rec[lead], fs
+        if analysis_fs and analysis_fs != fs:
+            with prof.stage('resample', source_fs=fs) as stage:
+                signal = stage.output(resample(signal, fs, analysis_fs))
+            work_fs = analysis_fs
+        scale = scale or qrs_scale(work_fs)
+        with prof.stage('baseline', method=baseline) as stage:
+            ecg = stage.output(remove_baseline(signal, work_fs, ECG_BASELINE_WINDOW, baseline,
+                                               degree=degree))
+        def detect(segment):
+            return detect_r_peaks(segment, work_fs, scale, window_size, threshold_value)
+
+        windows = None
+        if gate:
+            with prof.stage('quality') as stage:
+                windows = stage.output(assess(signal, work_fs))
+            with prof.stage('detect', scale=scale, gated=True) as stage:
+                peaks = stage.output(gated_peaks(ecg, work_fs, windows, detect))
+            spans = excluded_spans(windows)
+            row['excluded_s'] = float(np.sum(spans[:, 1] - spans[:, 0]))
+        else:
+            with prof.stage('detect', scale=scale) as stage:
+                peaks = stage.output(detect(ecg))
+        if work_fs != fs:
+            with prof.stage('refine') as stage:
+                peaks = stage.output(refine_peaks(rec[lead], peaks, work_fs, fs))
+        across = (beats_across_gaps(peaks, fs, windows) if gate
+                  else np.zeros(len(peaks), dtype=bool))
+        rr = (np.diff(peaks) / fs)[~across[1:]]
+        if beats_dir:
+            name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+            series = BeatSeries.from_peaks(peaks, fs, float(rec.time[0]) if len(rec) else 0.0,
+                                           across, source=row['file'])
+            series.save(os.path.join(beats_dir, name + '.beats.npz'))
+        mean_rr = float(np.mean(rr)) if len(rr) else np.nan
+        row.update(fs=fs, n_samples=len(rec), n_beats=len(peaks), mean_rr=mean_rr,
+                   bpm=60 / mean_rr if len(rr) else np.nan,
+                   rr_intervals=' '.join(f"{x:.3f}" for x in rr))
+    except Exception as exc:
+        row['error'] = f"{type(exc).__name__}: {exc}"
+    row['seconds'] = time.perf_counter() - start
+    if profile:
+        row['profile'] = prof.records
+    return row
+
+
+# ===== Summary file ===== #
+def read_summary(path):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=summary_columns)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, keep_default_na=False, na_values=[''])
+
+
+def _write_summary(path, rows):
+    df = pd.DataFrame(rows, columns=summary_columns)
+    tmp = path + '.tmp'
+    if path.endswith('.parquet'):
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+# Short hash of the chain parameters with process_file's defaults filled in,
+# so a resume only keeps rows computed with the same settings (beats_dir and
+# profile change what is written, not the results)
+def params_digest(params):
+    bound = inspect.signature(process_file).bind_partial(**params)
+    bound.apply_defaults()
+    values = {k: v for k, v in bound.arguments.items() if k not in ('beats_dir', 'profile')}
+    return hashlib.blake2b(json.dumps(values, sort_keys=True).encode(),
+                           digest_size=8).hexdigest()
+
+
+# Files already in the summary with the same size, mtime and parameters and
+# no error (summaries from before the params column never match)
+def _done_keys(summary):
+    ok = summary[summary['error'].fillna('') == '']
+    params = ok['params'].fillna('') if 'params' in ok else [''] * len(ok)
+    return set(zip(ok['file'], ok['size'].astype(int), ok['mtime_ns'].astype(int), params))
+
+
+def find_inputs(inputs, pattern):
+    files = []
+    for item in inputs:
+        if is_store(item):
+            files.append(item)
+        elif os.path.isdir(item):
+            files.extend(glob.glob(os.path.join(item, '**', pattern), recursive=True))
+        else:
+            files.extend(glob.glob(item))
+    return sorted(set(os.path.abspath(f) for f in files))
+
+
+# ===== Batch run ===== #
+def run_batch(files, output, workers=None, resume=True, log=sys.stderr, profile=None, **params):
+    summary = read_summary(output) if resume else pd.DataFrame(columns=summary_columns)
+    done = _done_keys(summary)
+    digest = params_digest(params)
+    todo = []
+    for f in files:
+        st = os.stat(f)
+        if (f, st.st_size, st.st_mtime_ns, digest) not in done:
+            todo.append(f)
+    redo = set(todo)
+    rows = [r for r in summary.to_dict('records') if r['file'] not in redo]
+    print(f"{len(files)} files, {len(files) - len(todo)} already processed, "
+          f"{len(todo)} to go", file=log)
+
+    start = time.perf_counter()
+    csv_out = None
+    if not output.endswith('.parquet'):
+        # CSV: rewrite what we kept, then append rows as they finish
+        _write_summary(output, rows)
+        csv_out = open(output, 'a', newline='')
+        writer = csv.DictWriter(csv_out, fieldnames=summary_columns, extrasaction='ignore')
+    profiles = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_file, f, profile=profile is not None, **params)
+                       for f in todo]
+            for n, fut in enumerate(as_completed(futures), 1):
+                row = fut.result()
+                row['params'] = digest
+                if 'profile' in row:
+                    profiles[row['file']] = row.pop('profile')
+                rows.append(row)
+                if csv_out is not None:
+                    writer.writerow(row)
+                    csv_out.flush()
+                elif n % CHECKPOINT_EVERY == 0:
+                    _write_summary(output, rows)
+                if row['error']:
+                    print(f"  failed {row['file']}: {row['error']}", file=log)
+                if n % CHECKPOINT_EVERY == 0 or n == len(todo):
+                    rate = n / (time.perf_counter() - start)
+                    print(f"  {n}/{len(todo)} files, {rate:.2f} files/s", file=log)
+    finally:
+        if csv_out is not None:
+            csv_out.close()
+        else:
+            _write_summary(output, rows)
+        if profile is not None:
+            with open(profile, 'w') as f:
+                json.dump(profiles, f, indent=2)
+
+    elapsed = time.perf_counter() - start
+    rate = len(todo) / elapsed if todo and elapsed > 0 else 0.0
+    print(f"processed {len(todo)} files in {elapsed:.1f} s ({rate:.2f} files/s)", file=log)
+    return rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Headless RR-interval batch over monitor text exports")
+    parser.add_argument('inputs', nargs='+', help="files, globs, directories or store directories")
+    parser.add_argument('-o', '--output', default='summary.csv',
+                        help="summary file (.csv or .parquet)")
+    parser.add_argument('--pattern', default='*.txt', help="file pattern inside directories")
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--no-resume', action='store_true', help="reprocess every file")
+    parser.add_argument('--profile', metavar='JSON', help="write per-file stage timings here")
+    parser.add_argument('--lead', default='II')
+    parser.add_argument('--fs', type=int, default=None, help="override detected rate")
+    parser.add_argument('--baseline', choices=baseline_methods, default='median')
+    parser.add_argument('--degree', type=int, default=2, help="degree for --baseline poly")
+    parser.add_argument('--scale', type=int, default=None,
+                        help="DWT scale for detection (default: chosen from fs)")
+    parser.add_argument('--window-size', type=int, default=DEFAULT_WINDOW_SIZE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD_VALUE)
+    parser.add_argument('--analysis-fs', type=int, default=None,
+                        help="resample to this rate before detection (RR stays at the source rate)")
+    parser.add_argument('--beats', metavar='DIR', help="save each file's beat series here")
+    parser.add_argument('--gate', action='store_true',
+                        help="skip detection on windows that fail the signal-quality check")
+    args = parser.parse_args(argv)
+    if args.beats:
+        os.makedirs(args.beats, exist_ok=True)
+
+    files = find_inputs(args.inputs, args.pattern)
+    run_batch(files, args.output, workers=args.workers, resume=not args.no_resume,
+              profile=args.profile,
+              lead=args.lead, fs=args.fs, baseline=args.baseline, degree=args.degree, scale=args.scale,
+              window_size=args.window_size, threshold_value=args.threshold,
+              analysis_fs=args.analysis_fs, beats_dir=args.beats, gate=args.gate)
+
+
+if __name__ == '__main__':
+    main()
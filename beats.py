@@ -0,0 +1,158 @@
+import argparse
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Quality flags (bits); a beat's RR enters the statistics only when it is 0
+QUALITY_OK = 0
+QUALITY_FIRST = 1         # no previous beat, so no RR
+QUALITY_RANGE = 2         # RR outside [MIN_RR, MAX_RR]
+QUALITY_JUMP = 4          # RR far from the median of its neighbours
+QUALITY_EXCLUDED = 8      # inside a span rejected by signal-quality gating
+MIN_RR = 0.25
+MAX_RR = 2.5
+JUMP_RATIO = 0.3
+JUMP_NEIGHBOURS = 5
+
+# One record per beat, packed (33 bytes)
+series_dtype = np.dtype([('index', np.int64), ('time', np.float64), ('rr', np.float64),
+                         ('hr', np.float64), ('quality', np.uint8)])
+
+
+# ===== RR quality ===== #
+# Range check plus a jump check against the running median of the
+# surrounding RR intervals (edge values repeated)
+def rr_quality(rr):
+    rr = np.asarray(rr, dtype=np.float64)
+    quality = np.zeros(len(rr), dtype=np.uint8)
+    quality[np.isnan(rr)] = QUALITY_FIRST
+    valid = ~np.isnan(rr)
+    quality[valid & ((rr < MIN_RR) | (rr > MAX_RR))] |= QUALITY_RANGE
+    if valid.sum() >= JUMP_NEIGHBOURS:
+        half = JUMP_NEIGHBOURS // 2
+        padded = np.pad(rr[valid], half, mode='edge')
+        local = np.median(sliding_window_view(padded, JUMP_NEIGHBOURS), axis=1)
+        jump = np.abs(rr[valid] - local) > JUMP_RATIO * local
+        quality[np.flatnonzero(valid)[jump]] |= QUALITY_JUMP
+    return quality
+
+
+def _prefix(x, dtype=np.float64):
+    out = np.zeros(len(x) + 1, dtype=dtype)
+    np.cumsum(x, out=out[1:])
+    return out
+
+
+# ===== Beat series ===== #
+# Array-backed beat list with prefix sums of the clean RR, HR and squared
+# successive differences, so count/mean/RMSSD over any [t0, t1) is two
+# searchsorted calls and a few subtractions. t0/t1 may be arrays (one
+# answer per window). A successive difference counts when both of its
+# beats are in the window and clean.
+class BeatSeries:
+    def __init__(self, beats, fs, source=None):
+        self.beats = np.asarray(beats, dtype=series_dtype)
+        self.fs = fs
+        self.source = source
+        # contiguous copy: searchsorted on the strided field would copy per call
+        self._time = np.ascontiguousarray(self.beats['time'])
+        clean = self.beats['quality'] == QUALITY_OK
+        rr = np.where(clean, self.beats['rr'], 0.0)
+        self._n = _prefix(clean, np.int64)
+        self._rr = _prefix(rr)
+        self._hr = _prefix(np.where(clean, self.beats['hr'], 0.0))
+        pair = clean[1:] & clean[:-1]
+        self._d2 = _prefix(np.where(pair, np.diff(rr) ** 2, 0.0))
+        self._pairs = _prefix(pair, np.int64)
+
+    # Peak sample indices at fs -> series; t0 is the time of sample 0.
+    # `excluded` marks beats to flag QUALITY_EXCLUDED (boolean per peak).
+    @classmethod
+    def from_peaks(cls, peaks, fs, t0=0.0, excluded=None, source=None):
+        peaks = np.asarray(peaks, dtype=np.int64)
+        beats = np.zeros(len(peaks), dtype=series_dtype)
+        beats['index'] = peaks
+        beats['time'] = t0 + peaks / fs
+        beats['rr'][:1] = np.nan
+        beats['rr'][1:] = np.diff(peaks) / fs
+        with np.errstate(divide='ignore'):
+            beats['hr'] = 60 / beats['rr']
+        beats['quality'] = rr_quality(beats['rr'])
+        if excluded is not None:
+            beats['quality'][np.asarray(excluded, dtype=bool)] |= QUALITY_EXCLUDED
+        return cls(beats, fs, source)
+
+    def __len__(self):
+        return len(self.beats)
+
+    @property
+    def time(self):
+        return self._time
+
+    # Beat index range [i0, i1) of beats with t0 <= time < t1
+    def range(self, t0=None, t1=None):
+        t = self._time
+        i0 = 0 if t0 is None else np.searchsorted(t, t0, side='left')
+        i1 = len(t) if t1 is None else np.searchsorted(t, t1, side='left')
+        return i0, np.maximum(i0, i1)
+
+    # Records of the beats in [t0, t1) (a view)
+    def window(self, t0=None, t1=None):
+        i0, i1 = self.range(t0, t1)
+        return self.beats[int(i0):int(i1)]
+
+    def count(self, t0=None, t1=None, clean=True):
+        i0, i1 = self.range(t0, t1)
+        return self._n[i1] - self._n[i0] if clean else i1 - i0
+
+    def mean_rr(self, t0=None, t1=None):
+        i0, i1 = self.range(t0, t1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self._rr[i1] - self._rr[i0]) / (self._n[i1] - self._n[i0])
+
+    def mean_hr(self, t0=None, t1=None):
+        i0, i1 = self.range(t0, t1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self._hr[i1] - self._hr[i0]) / (self._n[i1] - self._n[i0])
+
+    def rmssd(self, t0=None, t1=None):
+        i0, i1 = self.range(t0, t1)
+        # pairs (k, k+1) with k in [i0, i1 - 1)
+        j1 = np.maximum(i1 - 1, i0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt((self._d2[j1] - self._d2[i0]) / (self._pairs[j1] - self._pairs[i0]))
+
+    def summary(self, t0=None, t1=None):
+        return {'beats': int(self.count(t0, t1, clean=False)),
+                'clean_beats': int(self.count(t0, t1)),
+                'mean_rr': float(self.mean_rr(t0, t1)), 'mean_hr': float(self.mean_hr(t0, t1)),
+                'rmssd': float(self.rmssd(t0, t1))}
+
+    # ===== Binary file ===== #
+    # .npz (uncompressed) with the packed records and fs; loading reads the
+    # records back in one go and rebuilds the prefix sums
+    def save(self, file):
+        np.savez(file, beats=self.beats, fs=np.float64(self.fs),
+                 source=np.str_(self.source or ''))
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as data:
+            fs = float(data['fs'])
+            return cls(data['beats'], int(fs) if fs.is_integer() else fs,
+                       str(data['source']) or None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query a saved beat series")
+    parser.add_argument('file', help=".npz written by BeatSeries.save")
+    parser.add_argument('--t0', type=float, default=None)
+    parser.add_argument('--t1', type=float, default=None)
+    args = parser.parse_args(argv)
+    series = BeatSeries.load(args.file)
+    print(json.dumps(series.summary(args.t0, args.t1), indent=2))
+
+
+if __name__ == '__main__':
+    main()
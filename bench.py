@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from baseline import ECG_BASELINE_WINDOW, RESP_BASELINE_WINDOW, remove_baseline
+from cache import file_digest, nbytes, stage_cache
+from dwt import get_engine
+from freqresp import qrs_scale, resp_scale
+from hrv import sliding_hrv
+from loader import load_recording
+from pipeline import Pipeline
+from respiration import respiration_analysis
+from stages import (DEFAULT_WINDOW_SIZE, THRESHOLD_VALUE, baseline_shift, consensus_peaks,
+                    detect_rising_edges, threshold_signal, zero_lag_moving_average)
+from streaming import StreamingDWT, StreamingMAV, run_stream
+from synthetic import synthetic_recording, write_export
+from wavelet import KernelBank, dwt_scale
+
+# Reference outputs of the chain on samples.txt (125 Hz, lead II, median
+# baseline, j=3, window 21, threshold 0.31)
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples.txt')
+DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hrvresp.py')
+GOLDEN = {
+    'peaks': [38, 117, 198, 278, 358, 437, 519, 599, 677, 757, 837, 916, 994, 1029, 1075,
+              1155, 1234],
+    'mean_rr': 0.598,
+    'abs_sum': 260.9283510413319,
+    'mav_sum': 261.1690147203823,
+}
+GOLDEN_RTOL = 1e-6
+# Block sizes the streaming detector is checked with (1 sample to the whole file)
+STREAM_BLOCKS = (1, 7, 125, 1000, 5000)
+REGRESSION_RATIO = 1.2
+# Gapped record for check_gating: 900 s with lead II flat over the first span
+# and buried in noise over the second; gated SDNN must stay within
+# GAP_SDNN_RTOL of the clean record's
+GAP_DURATION = 900.0
+GAP_FLAT = (300.0, 390.0)
+GAP_NOISE = (600.0, 660.0)
+GAP_SDNN_RTOL = 0.1
+
+
+# ===== Stage plan ===== #
+# (name, fn) pairs run in order; fn gets the dict of earlier results.
+# Mirrors the dashboard chain, one entry per stage that can be timed alone.
+def stage_plan(path, fs, window_size=DEFAULT_WINDOW_SIZE, threshold_value=THRESHOLD_VALUE,
+               plots=True):
+    j_qrs, j_resp = qrs_scale(fs), resp_scale(fs)
+    scales = list(range(1, max(8, j_resp) + 1))
+    plan = [
+        ('load', lambda r: load_recording(path)),
+        ('baseline_shift', lambda r: baseline_shift(r['load']['II'], 2)),
+        ('remove_baseline', lambda r: remove_baseline(r['load']['II'], fs,
+                                                      ECG_BASELINE_WINDOW)),
+        ('remove_baseline_resp', lambda r: remove_baseline(r['load']['RESP'], fs,
+                                                           RESP_BASELINE_WINDOW)),
+        # a fresh bank each run, so the kernels are really rebuilt
+        ('kernel_build', lambda r: KernelBank().kernels(scales, fs)),
+    ]
+    for j in scales:
+        plan.append((f'dwt_j{j}', lambda r, j=j: dwt_scale(r['remove_baseline'], j, fs)))
+    plan += [
+        ('dwt_atrous', lambda r: get_engine(scales, fs, method='atrous').transform(
+            r['remove_baseline'])),
+        ('abs', lambda r: np.abs(r[f'dwt_j{j_qrs}'])),
+        ('zero_lag_moving_average', lambda r: zero_lag_moving_average(r['abs'], window_size)),
+        ('threshold', lambda r: threshold_signal(r['zero_lag_moving_average'], threshold_value)),
+        ('edges', lambda r: detect_rising_edges(r['threshold'])),
+        ('hrv', lambda r: sliding_hrv(r['edges'], fs, t_end=len(r['load']) / fs)),
+        ('respiration', lambda r: respiration_analysis(r['remove_baseline_resp'], r['edges'],
+                                                       fs)),
+    ]
+    if plots:
+        plan.append(('plot', lambda r: render_plot(r['load'].time, r['remove_baseline'])))
+    return plan
+
+
+# Dashboard-style figure of a whole channel, rendered to PNG bytes
+def render_plot(time_s, values):
+    import io
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from pyramid import MinMaxPyramid, plot_view
+
+    fig, ax = plt.subplots(figsize=(20, 5))
+    plot_view(ax, MinMaxPyramid(values, time_s), time_s[0], time_s[-1])
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    plt.close(fig)
+    return buf.getvalue()
+
+
+# ===== Measurement ===== #
+# Wall time of `repeat` runs, then one more run under tracemalloc for the
+# peak memory allocated by the stage (numpy buffers included)
+def run_plan(plan, repeat=3, memory=True):
+    results, report = {}, {}
+    for name, fn in plan:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = fn(results)
+            runs.append(time.perf_counter() - start)
+        peak = None
+        if memory:
+            tracemalloc.start()
+            fn(results)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = out
+        report[name] = {'seconds': statistics.median(runs), 'min_seconds': min(runs),
+                        'runs': runs, 'peak_bytes': peak, 'output_bytes': nbytes(out)}
+    return results, report
+
+
+# ===== Checks ===== #
+def _close(a, b):
+    return bool(np.isclose(a, b, rtol=GOLDEN_RTOL, atol=0))
+
+
+# Streaming DWT -> abs -> MAV fed `block` samples at a time, then flushed
+def _stream_mav(signal, block):
+    dwt, mav = StreamingDWT(), StreamingMAV()
+    out = [mav.process(np.abs(dwt.process(signal[s:s + block])))
+           for s in range(0, len(signal), block)]
+    out += [mav.process(np.abs(dwt.flush())), mav.flush()]
+    return np.concatenate(out)
+
+
+def check_golden(path=GOLDEN_FILE):
+    plan = stage_plan(path, 125, plots=False)
+    results, _ = run_plan([(name, fn) for name, fn in plan
+                           if name not in ('baseline_shift', 'hrv', 'respiration')],
+                          repeat=1, memory=False)
+    peaks = results['edges']
+    checks = {
+        'peaks': peaks.tolist() == GOLDEN['peaks'],
+        'mean_rr': _close(np.diff(peaks).mean() / 125, GOLDEN['mean_rr']),
+        'abs_sum': _close(results['abs'].sum(), GOLDEN['abs_sum']),
+        'mav_sum': _close(results['zero_lag_moving_average'].sum(), GOLDEN['mav_sum']),
+        # the a trous engine must give the same scales as the direct convolutions
+        'atrous': all(np.allclose(results['dwt_atrous'][j - 1], results[f'dwt_j{j}'],
+                                  atol=1e-9) for j in range(1, 9)),
+        # block-wise streaming output must equal the batch chain for any block size
+        'stream_mav': all(np.allclose(_stream_mav(results['remove_baseline'], b),
+                                      results['zero_lag_moving_average'], atol=1e-9)
+                          for b in STREAM_BLOCKS),
+        'stream_peaks': all(run_stream(results['remove_baseline'], b)['index'].tolist()
+                            == peaks.tolist() for b in STREAM_BLOCKS),
+    }
+    return {'ok': all(checks.values()), 'checks': checks}
+
+
+# The dashboard on samples.txt with profiling on (streamlit's AppTest, in
+# this process). A rerun served from the cache runs no pipeline stage; after
+# dropping the file's cache entries, hrv and respiration are each recorded
+# once, apart from their 'cache:' wrappers.
+def check_dashboard_profile(script=DASHBOARD, path=GOLDEN_FILE):
+    from collections import Counter
+
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(script, default_timeout=300).run()
+    next(c for c in app.sidebar.checkbox if c.label == "Profil tahap").check().run()
+    cached_run = Counter(r['name'] for r in app.session_state['profiler'].records)
+    stage_cache.invalidate(file_digest(path))
+    app.run()
+    fresh_run = Counter(r['name'] for r in app.session_state['profiler'].records)
+    checks = {
+        'no_exception': not app.exception,
+        'cached_rerun': all(name.startswith('cache:') for name in cached_run),
+        'hrv_once': fresh_run['hrv'] == 1 and fresh_run['cache:hrv'] == 1,
+        'respiration_once': fresh_run['respiration'] == 1 and fresh_run['cache:respiration'] == 1,
+    }
+    return {'ok': all(checks.values()), 'checks': checks}
+
+
+# Quality gating on a synthetic record with a flat and a noisy span: both
+# spans are excluded, no RR interval bridges them and HRV / respiration
+# match the clean record instead of seeing the gaps as 90 s beats.
+def check_gating(fs=125):
+    rec, _ = synthetic_recording(GAP_DURATION, fs)
+    ecg = rec['II'].copy()
+    ecg[int(GAP_FLAT[0] * fs):int(GAP_FLAT[1] * fs)] = 0
+    a, b = int(GAP_NOISE[0] * fs), int(GAP_NOISE[1] * fs)
+    ecg[a:b] += np.random.default_rng(1).normal(0, 2.0, b - a).astype(ecg.dtype)
+    gapped = Pipeline(fs, gate=True).run(ecg, rec['RESP'])
+    clean = Pipeline(fs, gate=True).run(rec['II'], rec['RESP'])
+    sdnn, clean_sdnn = np.nanmedian(gapped['hrv']['sdnn']), np.nanmedian(clean['hrv']['sdnn'])
+    checks = {
+        'excluded': all(any(lo <= s0 and s1 <= hi for lo, hi in gapped['excluded'])
+                        for s0, s1 in (GAP_FLAT, GAP_NOISE)),
+        'rr': bool(np.max(gapped['rr']) < 2 * np.median(clean['rr'])),
+        'sdnn': bool(abs(sdnn - clean_sdnn) <= GAP_SDNN_RTOL * clean_sdnn),
+        'respiration': bool(np.isfinite(gapped['respiration']['coherence']).any()),
+    }
+    return {'ok': all(checks.values()), 'checks': checks}
+
+
+# Detection F1 against the generator's true R-peaks. The detector reports
+# the rising edge of the thresholded MAV, ~half a window before the R-peak,
+# so a match is anything within 100 ms.
+def detection_score(found, truth, fs):
+    _, agreement = consensus_peaks([np.asarray(truth), np.asarray(found)], fs,
+                                   tolerance=0.1, min_leads=2)
+    return float(agreement[1])
+
+
+def compare(report, previous):
+    rows = []
+    for name, stage in report['stages'].items():
+        old = previous.get('stages', {}).get(name)
+        if old and old['seconds'] > 0:
+            ratio = stage['seconds'] / old['seconds']
+            rows.append((name, old['seconds'], stage['seconds'], ratio))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage timing and memory benchmark")
+    parser.add_argument('--duration', type=float, default=600.0,
+                        help="synthetic record length in seconds (86400 = 24 h)")
+    parser.add_argument('--fs', type=int, default=125)
+    parser.add_argument('--noise', type=float, default=0.02, help="ECG noise std (mV)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--input', help="benchmark an existing export instead")
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc runs")
+    parser.add_argument('--no-plots', action='store_true')
+    parser.add_argument('-o', '--output', default='bench.json')
+    parser.add_argument('--compare', help="previous JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    golden = check_golden()
+    print(f"golden check on samples.txt: {'ok' if golden['ok'] else 'FAILED'}", file=sys.stderr)
+    dashboard = check_dashboard_profile()
+    print(f"dashboard profile check: {'ok' if dashboard['ok'] else 'FAILED'}", file=sys.stderr)
+    gating = check_gating()
+    print(f"gating check on a gapped record: {'ok' if gating['ok'] else 'FAILED'}",
+          file=sys.stderr)
+
+    truth = None
+    tmp = None
+    if args.input:
+        path = args.input
+        fs = load_recording(path, channels=['II']).fs
+    else:
+        rec, truth = synthetic_recording(args.duration, args.fs, args.noise, seed=args.seed)
+        fs = args.fs
+        fd, tmp = tempfile.mkstemp(suffix='.txt')
+        os.close(fd)
+        write_export(tmp, rec)
+        path = tmp
+    try:
+        results, stages = run_plan(stage_plan(path, fs, plots=not args.no_plots),
+                                   args.repeat, not args.no_memory)
+    finally:
+        if tmp:
+            os.remove(tmp)
+
+    report = {
+        'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'machine': platform.machine(),
+                 'input': args.input or 'synthetic', 'duration': len(results['load']) / fs,
+                 'fs': fs, 'noise': args.noise, 'seed': args.seed, 'repeat': args.repeat},
+        'golden': golden,
+        'dashboard_profile': dashboard,
+        'gating': gating,
+        'stages': stages,
+    }
+    if truth is not None:
+        report['detection_f1'] = detection_score(results['edges'], truth, fs)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, stage in stages.items():
+        mem = '' if stage['peak_bytes'] is None else f"{stage['peak_bytes'] / 1e6:10.1f} MB"
+        print(f"{name:26s}{stage['seconds'] * 1000:10.2f} ms{mem}")
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        for name, old, new, ratio in compare(report, previous):
+            flag = '  REGRESSION' if ratio > REGRESSION_RATIO else ''
+            print(f"{name:26s}{old * 1000:10.2f} -> {new * 1000:10.2f} ms ({ratio:.2f}x){flag}")
+    return 0 if golden['ok'] and dashboard['ok'] and gating['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
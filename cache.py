@@ -0,0 +1,184 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 512 * 1024**2
+DEFAULT_MAX_DISK_BYTES = 4 * 1024**3
+
+_digests = {}
+
+
+# ===== Content hash ===== #
+# blake2b of the file contents. The digest is remembered per (path, size,
+# mtime), so a rerun on an unchanged file does not read it again, and any
+# change to the file gives a new digest (and therefore new cache keys).
+def file_digest(path, block_size=1 << 20):
+    st = os.stat(path)
+    stamp = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if stamp in _digests:
+        return _digests[stamp]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    for old in [k for k in _digests if k[0] == stamp[0]]:
+        del _digests[old]
+    _digests[stamp] = digest
+    return digest
+
+
+# Rough in-memory size of a cached value (arrays, bytes, containers, objects)
+def nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    if hasattr(value, '__dict__'):
+        return nbytes(vars(value))
+    return sys.getsizeof(value)
+
+
+def _key_name(key):
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+# ===== Stage cache ===== #
+# LRU cache for pipeline stage results, keyed by tuples such as
+# ('dwt', digest, fs, scales). Memory is bounded by max_bytes; with disk_dir
+# set, results are also pickled there (bounded by max_disk_bytes, oldest
+# files removed first) and reloaded on a memory miss.
+class StageCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+        self._inputs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, _key_name(key) + '.pkl')
+
+    def _load_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if stored_key != key:
+            return None
+        os.utime(path)
+        return (value,)
+
+    def _store_disk(self, key, value):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._disk_path(key)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._prune_disk()
+
+    def _prune_disk(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.disk_dir, name)
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _put(self, key, value):
+        size = nbytes(value)
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, old) = self._entries.popitem(last=False)
+            self._size -= old
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            stored = self._load_disk(key)
+            if stored is not None:
+                self.hits += 1
+                self._put(key, stored[0])
+                return stored[0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+            if self.disk_dir is not None:
+                self._store_disk(key, value)
+
+    def get_or_compute(self, key, compute):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    # Digest of an input file; entries of its previous contents are dropped
+    def track(self, path):
+        digest = file_digest(path)
+        old = self._inputs.get(os.path.abspath(path))
+        if old is not None and old != digest:
+            self.invalidate(old)
+        self._inputs[os.path.abspath(path)] = digest
+        return digest
+
+    # Drop every entry whose key contains `digest` (e.g. an input file that changed)
+    def invalidate(self, digest):
+        with self._lock:
+            for key in [k for k in self._entries if digest in k]:
+                self._size -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+stage_cache = StageCache(disk_dir=os.environ.get("HRVRESP_CACHE_DIR"))
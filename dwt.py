@@ -0,0 +1,226 @@
+from functools import lru_cache
+
+import numpy as np
+
+from wavelet import filter_n, g, h, kernel_bank, same_center, scale_support
+
+
+def _next_pow2(n):
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+# Apply a filter upsampled by `step` along the last axis (zeros outside x),
+# touching only the non-zero taps: y[m] = sum f[n] x[m - n*step].
+# `out` and `scratch` (same shape as x) are reused when given, so a cascade
+# allocates nothing per level.
+def _upsampled_filter(x, taps, step, out=None, scratch=None):
+    y = np.zeros_like(x) if out is None else out
+    y[...] = 0
+    if scratch is None:
+        scratch = np.empty_like(x)
+    length = x.shape[-1]
+    for f, n in zip(taps, filter_n):
+        shift = n * step
+        if f == 0 or abs(shift) >= length:
+            continue
+        if shift >= 0:
+            dst, src = np.s_[..., shift:], np.s_[..., :length - shift]
+        else:
+            dst, src = np.s_[..., :length + shift], np.s_[..., -shift:]
+        np.multiply(x[src], f, out=scratch[dst])
+        y[dst] += scratch[dst]
+    return y
+
+
+def _check_out(out, shape, single, dtype):
+    if out is None:
+        return np.zeros(shape, dtype=np.result_type(dtype, np.float32))
+    if single and out.shape == shape[1:]:
+        out = out[np.newaxis]
+    if out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+    return out
+
+
+# ===== A trous cascade ===== #
+# Undecimated Mallat filter bank: a_j = h(2^(j-1)) * a_(j-1) and
+# d_j = g(2^(j-1)) * a_(j-1), so every scale costs one 4-tap filter on the
+# previous approximation. d_j equals qj * x; it is read back at the same
+# offset dwt_scale() uses so both paths give the same arrays.
+# Works in the dtype of `out` (float64 unless the input or out is float32)
+# with the same four padded buffers for every level.
+def atrous_transform(signals, scales=range(1, 9), out=None):
+    x = np.asarray(signals)
+    single = x.ndim == 1
+    x = np.atleast_2d(x)
+    scales = list(scales)
+    n_ch, n = x.shape
+    shape = (n_ch, len(scales), n)
+    out = _check_out(out, shape, single, x.dtype)
+
+    cascade = _Cascade(x, max(scales), out.dtype)
+    for i, j in enumerate(scales):
+        cascade.detail(j, out[:, i, :])
+    return out[0] if single else out
+
+
+# Mallat cascade state for one block of channels: the padded approximation
+# at `level` plus work buffers. detail(j) continues from the current level
+# (or restarts from the input for a lower j) and writes d_j into `into`.
+class _Cascade:
+    def __init__(self, x, top, dtype):
+        self.x = x
+        self.n = x.shape[-1]
+        # zero margin wide enough that no level gets truncated at the edges
+        self.pad = 2**(top + 2)
+        self.top = top
+        shape = x.shape[:-1] + (self.n + 2 * self.pad,)
+        self.approx = np.zeros(shape, dtype=dtype)
+        self.spare = np.empty(shape, dtype=dtype)
+        self.work = np.empty(shape, dtype=dtype)
+        self.scratch = np.empty(shape, dtype=dtype)
+        self._restart()
+
+    def _restart(self):
+        self.approx[...] = 0
+        self.approx[..., self.pad:self.pad + self.n] = self.x
+        self.level = 0
+
+    def detail(self, j, into):
+        if j > self.top:
+            raise ValueError(f"Scale {j} above the cascade top {self.top}")
+        if j <= self.level:
+            self._restart()
+        while self.level < j - 1:
+            step = 2**self.level
+            _upsampled_filter(self.approx, h, step, self.spare, self.scratch)
+            self.approx, self.spare = self.spare, self.approx
+            self.level += 1
+        detail = _upsampled_filter(self.approx, g, 2**(j - 1), self.work, self.scratch)
+        start = self.pad + same_center(j) + scale_support(j)[0]
+        into[...] = detail[..., start:start + self.n]
+        return into
+
+    @property
+    def nbytes(self):
+        return self.approx.nbytes * 4
+
+
+# ===== Lazy scales ===== #
+# scales[j] runs the cascade only as far as scale j, on first use. With
+# keep=True details are memoized; otherwise only the cascade state is held
+# (four padded buffers), so memory follows the scales actually read and not
+# the eight of every channel. dtype=np.float32 halves all of it.
+class LazyScales:
+    def __init__(self, signals, fs=125, dtype=np.float64, max_scale=8, keep=True):
+        self.signals = np.asarray(signals)
+        self.fs = fs
+        self.dtype = np.dtype(dtype)
+        self.max_scale = max_scale
+        self.keep = keep
+        self._details = {}
+        self._cascade = None
+
+    def __getitem__(self, j):
+        if j in self._details:
+            return self._details[j]
+        if self._cascade is None:
+            self._cascade = _Cascade(np.atleast_2d(self.signals), self.max_scale, self.dtype)
+        d = np.empty(np.shape(np.atleast_2d(self.signals)), dtype=self.dtype)
+        self._cascade.detail(j, d)
+        d = d[0] if self.signals.ndim == 1 else d
+        if self.keep:
+            self._details[j] = d
+        return d
+
+    def __contains__(self, j):
+        return j in self._details
+
+    @property
+    def computed(self):
+        return sorted(self._details)
+
+    # Drop the cascade buffers (details already read stay valid)
+    def release(self):
+        self._cascade = None
+
+    @property
+    def nbytes(self):
+        held = sum(d.nbytes for d in self._details.values())
+        return held + (self._cascade.nbytes if self._cascade is not None else 0)
+
+
+# ===== FFT DWT engine ===== #
+# Runs every qj scale over every channel with overlap-add FFT blocks.
+# Kernel spectra are computed once per FFT size and reused; output matches
+# dwt_scale() (the old np.convolve(..., mode='same') alignment).
+# method='atrous' runs the filter-bank cascade instead of the long kernels.
+class DWTEngine:
+    def __init__(self, scales=range(1, 9), fs=125, block_size=None, bank=None,
+                 method="fft"):
+        if method not in ("fft", "atrous"):
+            raise ValueError(f"Unknown DWT method: {method}")
+        bank = kernel_bank if bank is None else bank
+        self.scales = list(scales)
+        self.fs = fs
+        self.method = method
+        self.kernels = bank.kernels(self.scales, fs)
+        self.centers = np.array([same_center(j) for j in self.scales])
+        self.max_taps = max(len(q) for q in self.kernels)
+        if block_size is None:
+            # roughly 4x the longest kernel keeps the FFT overhead per sample low
+            block_size = max(1024, _next_pow2(4 * self.max_taps)) - self.max_taps + 1
+        self.block_size = block_size
+        self._spectra = {}
+
+    def _spectrum(self, nfft):
+        if nfft not in self._spectra:
+            spec = np.empty((len(self.scales), nfft // 2 + 1), dtype=complex)
+            for i, q in enumerate(self.kernels):
+                spec[i] = np.fft.rfft(q, nfft)
+            self._spectra[nfft] = spec
+        return self._spectra[nfft]
+
+    # signals: (samples,) or (channels, samples)
+    # returns (scales, samples) or (channels, scales, samples)
+    def transform(self, signals, out=None):
+        if self.method == "atrous":
+            return atrous_transform(signals, self.scales, out)
+        x = np.asarray(signals)
+        single = x.ndim == 1
+        x = np.atleast_2d(x)
+        n_ch, n = x.shape
+        shape = (n_ch, len(self.scales), n)
+        out = _check_out(out, shape, single, x.dtype)
+        out[...] = 0
+
+        if n == 0:
+            return out[0] if single else out
+        block = min(self.block_size, n)
+        nfft = _next_pow2(block + self.max_taps - 1)
+        spec = self._spectrum(nfft)
+
+        for s in range(0, n, block):
+            seg = x[:, s:s + block]
+            xf = np.fft.rfft(seg, nfft, axis=-1)
+            y = np.fft.irfft(xf[:, np.newaxis, :] * spec[np.newaxis], nfft, axis=-1)
+            used = len(seg[0]) + self.max_taps - 1
+            # full-convolution index s + m lands on output sample s + m - center
+            for i, c in enumerate(self.centers):
+                lo = s - c
+                m0 = max(0, -lo)
+                m1 = min(used, n - lo)
+                if m1 > m0:
+                    out[:, i, lo + m0:lo + m1] += y[:, i, m0:m1]
+
+        return out[0] if single else out
+
+
+@lru_cache(maxsize=16)
+def _cached_engine(scales, fs, method):
+    return DWTEngine(scales, fs, method=method)
+
+
+# Shared engine per (scales, fs, method), so Streamlit reruns reuse the spectra
+def get_engine(scales=range(1, 9), fs=125, method="fft"):
+    return _cached_engine(tuple(scales), fs, method)
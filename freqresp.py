@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+import numpy as np
+
+from wavelet import filter_n, g, h
+
+# Physiological bands (Hz) the detector and the respiration panel look at
+QRS_BAND = (5.0, 15.0)
+RESP_BAND = (0.1, 0.5)
+# Passband edge relative to the peak of |Qj(f)| (-3 dB)
+PASSBAND_LEVEL = 1 / np.sqrt(2)
+MAX_SCALES = 12
+
+
+# ===== Filter response ===== #
+# |sum_n taps[n] e^(-i 2 pi f n / fs)| for every frequency in f at once.
+# The response is periodic in fs, so f * 2^k needs no lookup table.
+def filter_response(taps, f, fs, n=filter_n):
+    f = np.asarray(f, dtype=float)
+    phase = 2 * np.pi * np.multiply.outer(f, n) / fs
+    return np.abs(np.exp(-1j * phase) @ taps)
+
+
+# Frequency axis 0..fs/2 fine enough for the narrowest scale in `scales`
+def frequency_grid(fs, max_scale=8, n_points=None):
+    if n_points is None:
+        n_points = 2**(max_scale + 3) + 1
+    return np.linspace(0, fs / 2, n_points)
+
+
+# ===== Mallat Qj(f) ===== #
+# Qj(f) = |G(2^(j-1) f)| * |H(2^(j-2) f)| * ... * |H(f)|, one row per scale
+def qj_response(scales, fs, f=None):
+    scales = list(scales)
+    top = max(scales)
+    if min(scales) < 1:
+        raise ValueError("Scale j must be >= 1")
+    if f is None:
+        f = frequency_grid(fs, top)
+    octaves = np.multiply.outer(2.0**np.arange(top), f)
+    H = filter_response(h, octaves, fs)
+    G = filter_response(g, octaves, fs)
+    # lowpass products H(f) * H(2f) * ... * H(2^(j-2) f); scale 1 has none
+    lowpass = np.vstack([np.ones_like(f), np.cumprod(H[:-1], axis=0)])
+    idx = np.asarray(scales) - 1
+    return f, G[idx] * lowpass[idx]
+
+
+# Peak frequency and [lo, hi] band edges where Qj >= level * max(Qj)
+def passbands(scales, fs, level=PASSBAND_LEVEL, f=None):
+    f, Q = qj_response(scales, fs, f)
+    peak = Q.max(axis=1, keepdims=True)
+    inside = Q >= level * peak
+    lo = f[np.argmax(inside, axis=1)]
+    hi = f[len(f) - 1 - np.argmax(inside[:, ::-1], axis=1)]
+    return f[np.argmax(Q, axis=1)], lo, hi
+
+
+# ===== Scale selection ===== #
+# Scales whose passband overlaps `band`, ordered by how much of the band
+# they cover (best first). Goes up to max_scales octaves below fs/2.
+def select_scales(fs, band, max_scales=MAX_SCALES, level=PASSBAND_LEVEL):
+    scales = np.arange(1, max_scales + 1)
+    _, lo, hi = passbands(scales, fs, level)
+    overlap = np.minimum(hi, band[1]) - np.maximum(lo, band[0])
+    keep = overlap > 0
+    # log-frequency overlap so narrow low bands are not swamped by wide ones
+    cover = (np.log(np.minimum(hi, band[1]) / np.maximum(lo, band[0]).clip(1e-9))
+             / np.log(band[1] / band[0]))
+    order = np.argsort(-cover[keep], kind='stable')
+    return [int(j) for j in scales[keep][order]]
+
+
+# Memoized: every stream or pipeline at a given fs asks for the same scale
+@lru_cache(maxsize=32)
+def qrs_scale(fs, band=QRS_BAND):
+    return select_scales(fs, band)[0]
+
+
+@lru_cache(maxsize=32)
+def resp_scale(fs, band=RESP_BAND):
+    return select_scales(fs, band)[0]
@@ -0,0 +1,127 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Short-term HRV defaults: 5 min windows every 30 s, RR resampled at 4 Hz
+HRV_WINDOW = 300.0
+HRV_STEP = 30.0
+RESAMPLE_FS = 4.0
+LF_BAND = (0.04, 0.15)
+HF_BAND = (0.15, 0.4)
+NN50 = 0.05
+MIN_BEATS = 3
+SPECTRUM_BATCH = 1024
+
+# One record per window; metrics are NaN where the window has too few beats
+hrv_dtype = np.dtype([('start', np.float64), ('n_beats', np.int64),
+                      ('mean_rr', np.float64), ('mean_hr', np.float64),
+                      ('sdnn', np.float64), ('rmssd', np.float64), ('pnn50', np.float64),
+                      ('lf', np.float64), ('hf', np.float64), ('lf_hf', np.float64)])
+
+
+# ===== RR series ===== #
+# Beat times (s) and the RR interval ending at each beat, from peak indices.
+# `excluded` (boolean per peak, e.g. quality.beats_across_gaps) drops the RR
+# ending at those beats, so no interval bridges a rejected span.
+def rr_series(peaks, fs=125, excluded=None):
+    peaks = np.asarray(peaks)
+    beat_t, rr = peaks[1:] / fs, np.diff(peaks) / fs
+    if excluded is not None:
+        keep = ~np.asarray(excluded, dtype=bool)[1:]
+        beat_t, rr = beat_t[keep], rr[keep]
+    return beat_t, rr
+
+
+def window_starts(t_begin, t_end, window_s=HRV_WINDOW, step_s=HRV_STEP):
+    if t_end - t_begin < window_s:
+        return np.zeros(0)
+    return t_begin + step_s * np.arange(int((t_end - t_begin - window_s) // step_s) + 1)
+
+
+def _prefix(x):
+    out = np.zeros(len(x) + 1)
+    np.cumsum(x, out=out[1:])
+    return out
+
+
+# ===== Time domain ===== #
+# Every window at once: beats of [start, start + window_s) are located with
+# searchsorted and each metric is a difference of prefix sums.
+# Successive differences are counted in a window when both beats are in it.
+def time_domain(beat_t, rr, starts, window_s=HRV_WINDOW, min_beats=MIN_BEATS):
+    i0 = np.searchsorted(beat_t, starts, side='left')
+    i1 = np.searchsorted(beat_t, starts + window_s, side='left')
+    n = i1 - i0
+    s1, s2 = _prefix(rr), _prefix(rr**2)
+    hr = _prefix(60 / rr) if len(rr) else np.zeros(1)
+    d = np.diff(rr)
+    d2, nn = _prefix(d**2), _prefix(np.abs(d) > NN50)
+    # differences d[k] = rr[k+1] - rr[k] with k in [i0, i1 - 1)
+    m = np.maximum(n - 1, 0)
+    j1 = np.maximum(i1 - 1, i0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sum_rr = s1[i1] - s1[i0]
+        mean_rr = sum_rr / n
+        var = (s2[i1] - s2[i0] - sum_rr * mean_rr) / (n - 1)
+        out = {'n_beats': n, 'mean_rr': mean_rr,
+               'mean_hr': (hr[i1] - hr[i0]) / n,
+               'sdnn': np.sqrt(np.maximum(var, 0)),
+               'rmssd': np.sqrt((d2[j1] - d2[i0]) / m),
+               'pnn50': 100 * (nn[j1] - nn[i0]) / m}
+    bad = n < min_beats
+    for key in ('mean_rr', 'mean_hr', 'sdnn', 'rmssd', 'pnn50'):
+        out[key][bad] = np.nan
+    return out
+
+
+# ===== Frequency domain ===== #
+# RR interpolated once onto a RESAMPLE_FS grid; the windows are strided views
+# of that grid, detrended, Hann-tapered and transformed SPECTRUM_BATCH at a
+# time. Band powers in s^2; NaN where a window is shorter than 1/LF_BAND[0]
+# or has too few beats.
+def band_powers(beat_t, rr, starts, window_s=HRV_WINDOW, min_beats=MIN_BEATS,
+                resample_fs=RESAMPLE_FS, bands=(LF_BAND, HF_BAND)):
+    powers = np.full((len(bands), len(starts)), np.nan)
+    if len(starts) == 0 or len(rr) < 2 or window_s * LF_BAND[0] < 1:
+        return powers
+    step = 1 / resample_fs
+    grid_t0 = starts[0]
+    n_win = int(round(window_s * resample_fs))
+    offsets = np.round((starts - grid_t0) * resample_fs).astype(np.int64)
+    rr_grid = np.interp(grid_t0 + step * np.arange(offsets[-1] + n_win), beat_t, rr)
+    views = sliding_window_view(rr_grid, n_win)
+
+    taper = np.hanning(n_win)
+    freqs = np.fft.rfftfreq(n_win, step)
+    masks = np.array([(freqs >= lo) & (freqs < hi) for lo, hi in bands], dtype=float)
+    # one-sided periodogram scaling
+    scale = 2 / (resample_fs * np.sum(taper**2))
+    df = freqs[1]
+    for b in range(0, len(starts), SPECTRUM_BATCH):
+        seg = views[offsets[b:b + SPECTRUM_BATCH]]
+        seg = (seg - seg.mean(axis=1, keepdims=True)) * taper
+        psd = np.abs(np.fft.rfft(seg, axis=1))**2 * scale
+        powers[:, b:b + SPECTRUM_BATCH] = masks @ psd.T * df
+
+    counts = (np.searchsorted(beat_t, starts + window_s)
+              - np.searchsorted(beat_t, starts))
+    powers[:, counts < min_beats] = np.nan
+    return powers
+
+
+# ===== Sliding HRV ===== #
+# Structured array (hrv_dtype) with one row per window over [t_begin, t_end)
+def sliding_hrv(peaks, fs=125, window_s=HRV_WINDOW, step_s=HRV_STEP, t_begin=0.0,
+                t_end=None, min_beats=MIN_BEATS, excluded=None):
+    beat_t, rr = rr_series(peaks, fs, excluded)
+    if t_end is None:
+        t_end = beat_t[-1] if len(beat_t) else t_begin
+    starts = window_starts(t_begin, t_end, window_s, step_s)
+    out = np.zeros(len(starts), dtype=hrv_dtype)
+    out['start'] = starts
+    for key, value in time_domain(beat_t, rr, starts, window_s, min_beats).items():
+        out[key] = value
+    out['lf'], out['hf'] = band_powers(beat_t, rr, starts, window_s, min_beats)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['lf_hf'] = out['lf'] / out['hf']
+    return out
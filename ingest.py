@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from baseline import ECG_BASELINE_WINDOW, StreamingBaseline
+from freqresp import qrs_scale
+from loader import column_names, estimate_fs, parse_elapsed_time, parse_header
+from streaming import StreamingDetector, beat_dtype
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+READ_BYTES = 1 << 16
+QUEUE_BLOCKS = 8          # parsed blocks buffered per stream before reading stops
+FS_ROWS = 64              # rows used to estimate fs when it is not given
+BLOCK_S = 0.2             # replay block length (s of signal)
+
+
+# ===== Wire format ===== #
+# A stream is the monitor text export sent over TCP: an optional
+# "STREAM <id>" line, the two header lines (optional, the default column
+# layout is assumed without them) and tab-separated rows. The server answers
+# on the same connection with one JSON object per line:
+#   {"event": "beat", "stream": ..., "index": ..., "time": ..., "rr": ..., "hr": ...}
+# and, after the client closes its side, a final {"event": "end", ...} with
+# the stream's counters.
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _bytes_to_float32(column):
+    try:
+        return column.astype(np.float32)
+    except ValueError:
+        return np.array([_float_or_nan(v) for v in column], dtype=np.float32)
+
+
+# Complete lines -> (time_s, {channel: float32}); short rows, unparseable
+# times and non-numeric values are dropped like in loader.iter_chunks()
+def parse_rows(lines, names, channels):
+    rows = [r[:len(names)] for r in (line.split(b'\t') for line in lines)
+            if len(r) >= len(names)]
+    if not rows:
+        return np.zeros(0), {c: np.zeros(0, dtype=np.float32) for c in channels}
+    table = np.array(rows, dtype=bytes)
+    time_s = parse_elapsed_time(np.ascontiguousarray(table[:, 0]))
+    data = {c: _bytes_to_float32(table[:, names.index(c)]) for c in channels}
+    keep = ~np.isnan(time_s)
+    for values in data.values():
+        keep &= ~np.isnan(values)
+    if not keep.all():
+        time_s = time_s[keep]
+        data = {c: v[keep] for c, v in data.items()}
+    return time_s, data
+
+
+def _json_value(v):
+    v = v.item() if isinstance(v, np.generic) else v
+    return None if isinstance(v, float) and math.isnan(v) else v
+
+
+def beat_events(stream_id, beats):
+    return [json.dumps({'event': 'beat', 'stream': stream_id,
+                        **{name: _json_value(b[name]) for name in beat_dtype.names}})
+            for b in beats]
+
+
+# ===== Stream session ===== #
+# Incremental chain for one stream: local median baseline -> DWT at the QRS
+# scale for fs -> abs -> MAV -> threshold -> rising edges -> RR/HR
+# (streaming.StreamingDetector). Without a given fs the detector is created
+# once FS_ROWS rows have arrived. Beat times are on the stream's ElapsedTime
+# clock; cpu_seconds is the time spent parsing and processing this stream.
+class StreamSession:
+    def __init__(self, stream_id, lead='II', fs=None, baseline='median'):
+        self.stream_id = stream_id
+        self.lead = lead
+        self.fs = fs
+        self.baseline_method = baseline
+        self.detector = None
+        self.rows = 0
+        self.beats = 0
+        self.cpu_seconds = 0.0
+        self.t_first = None
+        self._held_time = []
+        self._held = []
+
+    def _start(self, fs):
+        self.fs = fs
+        self.detector = StreamingDetector(
+            fs, scale=qrs_scale(fs),
+            baseline=StreamingBaseline(fs, ECG_BASELINE_WINDOW, self.baseline_method))
+
+    def _run(self, step, *args):
+        start = time.process_time()
+        beats = step(*args)
+        self.cpu_seconds += time.process_time() - start
+        beats['time'] += self.t_first or 0.0
+        self.beats += len(beats)
+        return beats
+
+    def feed(self, time_s, values):
+        if len(time_s) == 0:
+            return np.zeros(0, dtype=beat_dtype)
+        if self.t_first is None:
+            self.t_first = float(time_s[0])
+        self.rows += len(time_s)
+        if self.detector is None:
+            self._held_time.append(time_s)
+            self._held.append(values)
+            held_time = np.concatenate(self._held_time)
+            if self.fs is None and len(held_time) < FS_ROWS:
+                return np.zeros(0, dtype=beat_dtype)
+            self._start(self.fs or estimate_fs(held_time))
+            values = np.concatenate(self._held)
+            self._held_time, self._held = [], []
+        return self._run(self.detector.process, values)
+
+    def finish(self):
+        if self.detector is None:
+            if not self._held:
+                return np.zeros(0, dtype=beat_dtype)
+            held_time = np.concatenate(self._held_time)
+            fs = self.fs or estimate_fs(held_time)
+            if fs is None:
+                return np.zeros(0, dtype=beat_dtype)
+            self._start(fs)
+            self._run(self.detector.process, np.concatenate(self._held))
+        return self._run(self.detector.flush)
+
+    def stats(self):
+        seconds = self.rows / self.fs if self.fs else 0.0
+        return {'stream': self.stream_id, 'fs': self.fs, 'rows': self.rows,
+                'seconds': seconds, 'beats': self.beats, 'cpu_seconds': self.cpu_seconds,
+                'mean_hr': _json_value(self.detector.heart_rate) if self.detector else None}
+
+
+# ===== Server ===== #
+# One asyncio task pair per connection: the reader parses complete lines
+# into blocks on a bounded queue and the processor runs the chain and writes
+# events. When processing falls behind, queue.put() waits, the reader stops
+# reading and TCP flow control slows the sender; a client that does not read
+# its events blocks writer.drain() the same way. Everything runs on one
+# event loop, i.e. one core: the per-stream cpu_seconds say how many
+# real-time streams that core sustains.
+class IngestServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, lead='II', fs=None,
+                 baseline='median', queue_blocks=QUEUE_BLOCKS, on_beat=None, log=sys.stderr):
+        self.host = host
+        self.port = port
+        self.lead = lead
+        self.fs = fs
+        self.baseline = baseline
+        self.queue_blocks = queue_blocks
+        self.on_beat = on_beat
+        self.log = log
+        self.active = {}
+        self.finished = []
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    async def _read_header(self, reader, default_id):
+        stream_id = default_id
+        line = await reader.readline()
+        if line.startswith(b'STREAM '):
+            stream_id = line[len(b'STREAM '):].strip().decode()
+            line = await reader.readline()
+        if line.strip().startswith(column_names[0].encode()):
+            units = await reader.readline()
+            names, _ = parse_header([line.decode(), units.decode()])
+            return stream_id, names, b''
+        # no header: `line` is already the first row
+        return stream_id, list(column_names), line
+
+    async def _read_blocks(self, reader, queue, session, names, pending):
+        channels = [self.lead]
+        try:
+            while True:
+                data = await reader.read(READ_BYTES)
+                pending += data
+                cut = len(pending) if not data else pending.rfind(b'\n') + 1
+                if cut:
+                    lines = pending[:cut].splitlines()
+                    pending = pending[cut:]
+                    start = time.process_time()
+                    time_s, values = parse_rows(lines, names, channels)
+                    session.cpu_seconds += time.process_time() - start
+                    await queue.put((time_s, values[self.lead]))
+                if not data:
+                    break
+        except Exception:
+            # the processor stops and read_task re-raises; not on cancellation,
+            # where nobody reads the queue any more
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _send(self, writer, session, beats):
+        if len(beats) == 0:
+            return
+        if self.on_beat is not None:
+            self.on_beat(session, beats)
+        writer.write(('\n'.join(beat_events(session.stream_id, beats)) + '\n').encode())
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        default_id = f"{peer[0]}:{peer[1]}" if peer else 'stream'
+        session = None
+        read_task = None
+        try:
+            stream_id, names, first = await self._read_header(reader, default_id)
+            if self.lead not in names:
+                raise ValueError(f"Stream has no {self.lead} column: {names}")
+            session = StreamSession(stream_id, self.lead, self.fs, self.baseline)
+            self.active[stream_id] = session
+            queue = asyncio.Queue(self.queue_blocks)
+            read_task = asyncio.ensure_future(self._read_blocks(reader, queue, session, names, first))
+            while True:
+                block = await queue.get()
+                if block is None:
+                    break
+                await self._send(writer, session, session.feed(*block))
+            await read_task
+            await self._send(writer, session, session.finish())
+            stats = session.stats()
+            writer.write((json.dumps({'event': 'end', **stats}) + '\n').encode())
+            await writer.drain()
+            self.finished.append(stats)
+            if self.log is not None:
+                rate = stats['seconds'] / stats['cpu_seconds'] if stats['cpu_seconds'] else math.inf
+                print(f"{stream_id}: {stats['rows']} rows, {stats['beats']} beats, "
+                      f"{stats['cpu_seconds'] * 1000:.1f} ms CPU ({rate:.0f}x real time)",
+                      file=self.log)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            writer.write((json.dumps({'event': 'error', 'message': str(e)}) + '\n').encode())
+        finally:
+            if read_task is not None:
+                # a processor failure leaves the reader pending: stop it and
+                # collect its outcome so nothing is left unretrieved
+                read_task.cancel()
+                await asyncio.gather(read_task, return_exceptions=True)
+            if session is not None:
+                self.active.pop(session.stream_id, None)
+            writer.close()
+
+
+# ===== Replay client ===== #
+# Streams a recording to the server as N concurrent patients, in blocks of
+# BLOCK_S seconds paced at `speed` x real time (speed=0: as fast as the
+# server accepts). Reports how far sending fell behind schedule, the delay
+# from a beat's sample being sent to its event arriving, and the server's
+# CPU per second of signal.
+@lru_cache(maxsize=4)
+def _export_rows(path, loop):
+    from store import open_recording
+    from synthetic import format_elapsed_time
+    rec = open_recording(path)
+    names = [c for c in column_names[1:] if c in rec.channels]
+    step = 1 / rec.fs if rec.fs else 0.0
+    offset = loop * (float(rec.time[-1]) + step) if len(rec) else 0.0
+    columns = [np.char.rjust(format_elapsed_time(rec.time + offset).astype(str), 15)]
+    columns += [np.char.mod('%7.3f', rec[c]) for c in names]
+    rows = columns[0]
+    for col in columns[1:]:
+        rows = np.char.add(np.char.add(rows, '\t'), col)
+    header = (f"{column_names[0]:>14}" + ''.join(f"\t{c + ',':>6} " for c in names) + '\r\n'
+              + '\t'.join([f"{'hh:mm:ss.mmm':>15}"]
+                          + [f"{'(' + rec.units.get(c, '') + ')':>7}" for c in names]) + '\r\n')
+    return header.encode(), [(r + '\r\n').encode() for r in rows], rec.fs
+
+
+async def _receive(reader, result, clock):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        event = json.loads(line)
+        if event['event'] == 'beat':
+            result['beat_times'].append(clock())
+            result['beat_index'].append(event['index'])
+        else:
+            result[event['event']] = event
+
+
+async def replay_stream(path, stream_id, host=DEFAULT_HOST, port=DEFAULT_PORT, speed=1.0,
+                        loops=1, block_s=BLOCK_S):
+    header, _, fs = _export_rows(path, 0)
+    block_rows = max(1, int(round(block_s * fs)))
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection(host, port)
+    result = {'stream': stream_id, 'rows': 0, 'max_lag': 0.0, 'beat_times': [],
+              'beat_index': []}
+    receiving = asyncio.ensure_future(_receive(reader, result, loop.time))
+    writer.write(f"STREAM {stream_id}\n".encode() + header)
+    start = loop.time()
+    sent = 0
+    for k in range(loops):
+        rows = _export_rows(path, k)[1]
+        for s in range(0, len(rows), block_rows):
+            block = rows[s:s + block_rows]
+            if speed:
+                due = start + sent / (fs * speed)
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                result['max_lag'] = max(result['max_lag'], loop.time() - due)
+            writer.write(b''.join(block))
+            await writer.drain()
+            sent += len(block)
+    writer.write_eof()
+    await receiving
+    writer.close()
+    result['rows'] = sent
+    result['wall'] = loop.time() - start
+    if speed:
+        # sample i is due at start + (i + 1) / (fs * speed)
+        due = start + (np.asarray(result['beat_index']) + 1) / (fs * speed)
+        result['latency'] = np.asarray(result['beat_times']) - due
+    return result
+
+
+async def replay(path, streams=1, host=DEFAULT_HOST, port=DEFAULT_PORT, speed=1.0, loops=1,
+                 block_s=BLOCK_S):
+    return await asyncio.gather(*[
+        replay_stream(path, f"replay-{i}", host, port, speed, loops, block_s)
+        for i in range(streams)])
+
+
+def replay_report(results, speed, block_s=BLOCK_S):
+    ends = [r['end'] for r in results if 'end' in r]
+    rows = sum(r['rows'] for r in results)
+    wall = max(r['wall'] for r in results)
+    signal_s = sum(e['seconds'] for e in ends)
+    cpu = sum(e['cpu_seconds'] for e in ends)
+    report = {'streams': len(results), 'rows': rows, 'wall_seconds': wall,
+              'signal_seconds': signal_s, 'beats': sum(len(r['beat_index']) for r in results),
+              'throughput_x_realtime': signal_s / wall if wall else None,
+              'server_cpu_seconds': cpu,
+              'streams_per_core': signal_s / cpu if cpu else None}
+    if speed:
+        lag = max(r['max_lag'] for r in results)
+        latency = np.concatenate([r['latency'] for r in results])
+        report.update(speed=speed, max_send_lag=lag, kept_up=lag < block_s / speed,
+                      latency_median=float(np.median(latency)) if len(latency) else None,
+                      latency_p95=float(np.percentile(latency, 95)) if len(latency) else None)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live R-peak detection over TCP sample streams")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="accept streams and publish beat events")
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--lead', default='II')
+    serve.add_argument('--fs', type=int, default=None, help="override detected rate")
+    serve.add_argument('--baseline', choices=['median', 'mavg'], default='median')
+    serve.add_argument('--queue', type=int, default=QUEUE_BLOCKS,
+                       help="parsed blocks buffered per stream")
+    rep = sub.add_parser('replay', help="stream a recording as N concurrent patients")
+    rep.add_argument('input', help="text export or store directory")
+    rep.add_argument('--host', default=DEFAULT_HOST)
+    rep.add_argument('--port', type=int, default=DEFAULT_PORT)
+    rep.add_argument('-n', '--streams', type=int, default=1)
+    rep.add_argument('--speed', type=float, default=1.0,
+                     help="x real time (0 = as fast as possible)")
+    rep.add_argument('--loops', type=int, default=1, help="times to repeat the recording")
+    rep.add_argument('--block', type=float, default=BLOCK_S, help="seconds of signal per send")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = IngestServer(args.host, args.port, args.lead, args.fs, args.baseline, args.queue)
+
+        async def run():
+            await server.start()
+            print(f"listening on {server.host}:{server.port}", file=sys.stderr)
+            await server.serve_forever()
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    else:
+        results = asyncio.run(replay(args.input, args.streams, args.host, args.port, args.speed,
+                                     args.loops, args.block))
+        print(json.dumps(replay_report(results, args.speed, args.block), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from cache import nbytes
+
+
+# ===== Stage record ===== #
+# One timed stage: wall time, tracemalloc peak above the memory in use when
+# it started (with memory=True), size/shape of its output and, for cached
+# stages, whether the result came from the cache
+class _Stage:
+    def __init__(self, profiler, name, info):
+        self.profiler = profiler
+        self.record = {'name': name, 'seconds': None, 'peak_bytes': None,
+                       'output_bytes': None, 'shape': None, 'dtype': None, 'cache': None}
+        self.record.update(info)
+        self._child_peak = 0
+
+    def output(self, value):
+        self.record['output_bytes'] = nbytes(value)
+        if isinstance(value, np.ndarray):
+            self.record['shape'] = list(value.shape)
+            self.record['dtype'] = str(value.dtype)
+        return value
+
+    def cache(self, hit):
+        self.record['cache'] = 'hit' if hit else 'miss'
+
+    def __enter__(self):
+        stack = self.profiler._stack
+        if self.profiler.memory:
+            self._base = tracemalloc.get_traced_memory()[0]
+            if stack:
+                # keep the parent's peak so far before resetting for this stage
+                stack[-1]._child_peak = max(stack[-1]._child_peak,
+                                            tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.record['seconds'] = time.perf_counter() - self._start
+        stack = self.profiler._stack
+        stack.pop()
+        if self.profiler.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            self.record['peak_bytes'] = peak - self._base
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+        self.profiler.records.append(self.record)
+        return False
+
+
+class _NullStage:
+    record = None
+
+    def output(self, value):
+        return value
+
+    def cache(self, hit):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+# ===== Profiler ===== #
+# `with profiler.stage('dwt', scales=8) as s: s.output(x)` records one stage.
+# Disabled, stage() hands back a shared no-op context, so instrumented code
+# costs one attribute check per stage. memory=True traces allocations with
+# tracemalloc, which slows numpy-heavy stages noticeably; it is off unless
+# asked for.
+class Profiler:
+    def __init__(self, enabled=False, memory=False):
+        self.enabled = False
+        self.memory = False
+        self.records = []
+        self._stack = []
+        self.configure(enabled, memory)
+
+    def configure(self, enabled=True, memory=False):
+        self.enabled = enabled
+        memory = enabled and memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif self.memory and not memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = memory
+
+    def stage(self, name, **info):
+        if not self.enabled:
+            return _null_stage
+        return _Stage(self, name, info)
+
+    def reset(self):
+        self.records = []
+
+    # Totals per stage name, slowest first
+    def summary(self):
+        totals = {}
+        for r in self.records:
+            t = totals.setdefault(r['name'], {'name': r['name'], 'calls': 0, 'seconds': 0.0,
+                                              'peak_bytes': None, 'hits': 0, 'misses': 0})
+            t['calls'] += 1
+            t['seconds'] += r['seconds']
+            if r['peak_bytes'] is not None:
+                t['peak_bytes'] = max(t['peak_bytes'] or 0, r['peak_bytes'])
+            if r['cache'] == 'hit':
+                t['hits'] += 1
+            elif r['cache'] == 'miss':
+                t['misses'] += 1
+        return sorted(totals.values(), key=lambda t: -t['seconds'])
+
+    def to_dict(self):
+        return {'stages': self.records, 'summary': self.summary()}
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2, default=str)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+
+# HRVRESP_PROFILE turns profiling on by default (this instance and the
+# dashboard's per-session profilers)
+PROFILE = bool(os.environ.get("HRVRESP_PROFILE"))
+profiler = Profiler(enabled=PROFILE)
@@ -0,0 +1,141 @@
+import numpy as np
+
+# Columns of the monitor text export, used when the header line is missing
+column_names = ['ElapsedTime', 'RESP', 'PLETH', 'V', 'AVR', 'II']
+HEADER_LINES = 2
+CHUNK_ROWS = 200_000
+
+_DIGIT0, _COLON, _DOT = ord('0'), ord(':'), ord('.')
+_BLANK = np.array([ord(' '), ord('\t'), ord('\r'), ord('\n'), 0], dtype=np.uint8)
+
+
+# ===== Header ===== #
+# Two header lines: channel names ("RESP, ") and units ("(mV)")
+def read_header(path):
+    with open(path, 'r', newline='') as f:
+        lines = [f.readline() for _ in range(HEADER_LINES)]
+    return parse_header(lines)
+
+
+# Same, from the two header lines already read (e.g. from a socket)
+def parse_header(lines):
+    names = [c.strip().rstrip(',').strip() for c in lines[0].split('\t')]
+    units = [c.strip().strip('()') for c in lines[1].split('\t')]
+    if len(names) != len(units) or names[0] != column_names[0]:
+        names, units = list(column_names), [''] * len(column_names)
+    return names, dict(zip(names, units))
+
+
+# ===== Time conversion: [hh:]mm:ss.mmm to seconds ===== #
+# Works on the raw bytes of the whole column at once: each character is
+# assigned to a field by counting the ':' to its right (0 = seconds,
+# 1 = minutes, 2 = hours) and weighted by the digits after it in that field.
+# Unparseable entries become NaN.
+def parse_elapsed_time(values):
+    raw = np.asarray(values, dtype=bytes)
+    n = len(raw)
+    if n == 0:
+        return np.zeros(0)
+    width = raw.dtype.itemsize
+    u = raw.view(np.uint8).reshape(n, width)
+
+    is_digit = (u >= _DIGIT0) & (u <= _DIGIT0 + 9)
+    is_colon = u == _COLON
+    is_dot = u == _DOT
+    valid = ~np.any(~(is_digit | is_colon | is_dot | np.isin(u, _BLANK)), axis=1)
+
+    field = np.cumsum(is_colon[:, ::-1], axis=1)[:, ::-1] - is_colon
+    n_colons = is_colon.sum(axis=1)
+    valid &= (n_colons <= 2) & (is_dot.sum(axis=1) <= 1)
+    # a dot is only allowed in the seconds field
+    valid &= ~np.any(is_dot & (field > 0), axis=1)
+
+    digits = np.where(is_digit, u - _DIGIT0, 0).astype(np.int64)
+    seconds = np.zeros(n)
+    for f, scale in ((0, 1), (1, 60), (2, 3600)):
+        in_field = is_digit & (field == f)
+        if f == 0:
+            valid &= in_field.any(axis=1)
+        # digits to the right of each position within the same field
+        after = np.cumsum(in_field[:, ::-1], axis=1)[:, ::-1] - in_field
+        value = np.sum(digits * 10 ** np.where(in_field, after, 0) * in_field, axis=1)
+        if f == 0:
+            dot_pos = np.where(is_dot.any(axis=1), is_dot.argmax(axis=1), width)
+            frac = np.sum(in_field & (np.arange(width) > dot_pos[:, None]), axis=1)
+            seconds += value / 10.0 ** frac
+        else:
+            seconds += scale * value
+    seconds[~valid] = np.nan
+    return seconds
+
+
+def _to_float32(column):
+    if column.dtype == object:
+        import pandas as pd
+        column = pd.to_numeric(column, errors='coerce')
+    return column.to_numpy(dtype=np.float32, na_value=np.nan)
+
+
+# ===== Read data ===== #
+# Yields (time_s, {channel: float32 array}) per chunk of rows. Rows with an
+# unparseable time or any missing/non-numeric channel value are dropped,
+# like the old dropna passes.
+def iter_chunks(path, channels=None, chunksize=CHUNK_ROWS):
+    # pandas is only needed to parse text, so importing loader stays cheap
+    import pandas as pd
+
+    names, _ = read_header(path)
+    channels = [c for c in names[1:] if c] if channels is None else list(channels)
+    reader = pd.read_csv(path, sep='\t', skiprows=HEADER_LINES, header=None,
+                         names=names, usecols=[names[0]] + channels,
+                         dtype={names[0]: str}, chunksize=chunksize)
+    for chunk in reader:
+        time_s = parse_elapsed_time(chunk[names[0]].fillna('').to_numpy())
+        data = {c: _to_float32(chunk[c]) for c in channels}
+        keep = ~np.isnan(time_s)
+        for values in data.values():
+            keep &= ~np.isnan(values)
+        if not keep.all():
+            time_s = time_s[keep]
+            data = {c: v[keep] for c, v in data.items()}
+        yield time_s, data
+
+
+# ===== Recording ===== #
+# Time in seconds (float64, float32 would lose ms after ~4.6 h) and one
+# float32 array per channel, plus the channel units from the header
+class Recording:
+    def __init__(self, time, channels, units=None, source=None):
+        self.time = time
+        self.channels = channels
+        self.units = units or {}
+        self.source = source
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def fs(self):
+        return estimate_fs(self.time)
+
+
+# Sampling rate from the median sample spacing, rounded to a whole Hz
+def estimate_fs(time):
+    if len(time) < 2:
+        return None
+    return int(round(1 / np.median(np.diff(time[:100_000]))))
+
+
+def load_recording(path, channels=None, chunksize=CHUNK_ROWS):
+    _, units = read_header(path)
+    times, parts = [], {}
+    for time_s, data in iter_chunks(path, channels, chunksize):
+        times.append(time_s)
+        for c, v in data.items():
+            parts.setdefault(c, []).append(v)
+    time = np.concatenate(times) if times else np.zeros(0)
+    data = {c: np.concatenate(v) for c, v in parts.items()}
+    return Recording(time, data, {c: units.get(c, '') for c in data}, source=path)
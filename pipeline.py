@@ -0,0 +1,221 @@
+import numpy as np
+
+import freqresp
+from baseline import ECG_BASELINE_WINDOW, RESP_BASELINE_WINDOW, remove_baseline
+from beats import QUALITY_EXCLUDED, BeatSeries
+from dwt import LazyScales, get_engine
+from hrv import HRV_STEP, HRV_WINDOW, rr_series, sliding_hrv
+from instrument import Profiler
+from loader import load_recording
+from quality import assess, beats_across_gaps, excluded_spans, gate_segments
+from resample import refine_peaks, resample
+from respiration import RESP_STEP, RESP_WINDOW, respiration_analysis
+from stages import (DEFAULT_WINDOW_SIZE, THRESHOLD_VALUE, consensus_peaks, detect_rising_edges,
+                    threshold_signal, zero_lag_moving_average)
+
+# Everything here needs numpy only (pandas just for reading text exports);
+# streamlit and matplotlib stay in the dashboard.
+
+
+# ===== Pipeline ===== #
+# The dashboard chain as plain calls with arrays in and arrays out:
+# baseline -> DWT -> abs -> MAV -> threshold -> R-peaks -> RR/HRV and
+# respiration. Parameters are fixed per instance; the QRS and respiration
+# scales default to the ones chosen for fs. Stage methods take one signal
+# (samples,) or a block of leads (channels, samples) like stages.py.
+# dtype='float32' runs the DWT, MAV and threshold stages in single precision
+# (the baseline and the MAV prefix sums stay float64).
+# gate=True scores the ECG in fixed windows first (quality.py) and runs the
+# DWT, MAV and threshold stages only on the usable spans of a single lead.
+class Pipeline:
+    def __init__(self, fs=125, baseline='median', degree=2, scale=None, resp_scale=None,
+                 window_size=DEFAULT_WINDOW_SIZE, threshold_value=THRESHOLD_VALUE,
+                 dtype='float64', gate=False, profiler=None):
+        self.fs = fs
+        self.baseline_method = baseline
+        self.degree = degree
+        self.scale = scale or freqresp.qrs_scale(fs)
+        self.resp_scale = resp_scale or freqresp.resp_scale(fs)
+        self.scales = tuple(range(1, max(8, self.scale, self.resp_scale) + 1))
+        self.window_size = window_size
+        self.threshold_value = threshold_value
+        self.dtype = np.dtype(dtype)
+        self.gate = gate
+        self.profiler = profiler or Profiler()
+
+    def params(self):
+        return {'fs': self.fs, 'baseline': self.baseline_method, 'degree': self.degree,
+                'scale': self.scale, 'resp_scale': self.resp_scale,
+                'window_size': self.window_size, 'threshold_value': self.threshold_value,
+                'dtype': self.dtype.name, 'gate': self.gate}
+
+    # Same pipeline with some parameters changed
+    def replace(self, **changes):
+        return Pipeline(**dict(self.params(), **changes), profiler=self.profiler)
+
+    # --- stages ---
+    def baseline(self, signal, window_s=ECG_BASELINE_WINDOW):
+        with self.profiler.stage('baseline') as stage:
+            return stage.output(remove_baseline(signal, self.fs, window_s, self.baseline_method,
+                                                degree=self.degree))
+
+    # (scales, N) or (channels, scales, N) for the given (default: all) scales
+    def dwt(self, signals, scales=None):
+        scales = self.scales if scales is None else tuple(scales)
+        with self.profiler.stage('dwt', scales=len(scales)) as stage:
+            shape = np.shape(signals)[:-1] + (len(scales), np.shape(signals)[-1])
+            out = np.empty(shape, dtype=self.dtype)
+            engine = get_engine(scales, self.fs, method="atrous")
+            return stage.output(engine.transform(signals, out))
+
+    # Scales computed on first access only (see dwt.LazyScales)
+    def lazy_dwt(self, signals, keep=True):
+        return LazyScales(signals, self.fs, self.dtype, max(self.scales), keep)
+
+    # Detail at the detection scale alone; the cascade buffers go away after
+    def detail(self, ecg):
+        with self.profiler.stage('dwt', scales=1) as stage:
+            return stage.output(self.lazy_dwt(ecg, keep=False)[self.scale])
+
+    # abs -> MAV; inplace=True takes the absolute value in the detail buffer
+    def envelope(self, detail, inplace=False):
+        with self.profiler.stage('mav') as stage:
+            rectified = np.abs(detail, out=detail if inplace else None)
+            out = np.empty(np.shape(detail), dtype=self.dtype)
+            return stage.output(zero_lag_moving_average(rectified, self.window_size, out))
+
+    def threshold(self, envelope, out=None):
+        with self.profiler.stage('threshold') as stage:
+            return stage.output(threshold_signal(envelope, self.threshold_value, out))
+
+    def edges(self, thresholded):
+        with self.profiler.stage('edges'):
+            return detect_rising_edges(thresholded)
+
+    # Baselined ECG lead(s) -> R-peak indices (one array per lead for a block)
+    def peaks(self, ecg):
+        envelope = self.envelope(self.detail(ecg), inplace=True)
+        # the envelope is not needed afterwards, so it holds the threshold too
+        return self.edges(self.threshold(envelope, out=envelope))
+
+    def consensus(self, lead_peaks, tolerance=0.1, min_leads=None):
+        return consensus_peaks(lead_peaks, self.fs, tolerance, min_leads)
+
+    # peaks at `fs` (default: the analysis rate); `excluded` (boolean per
+    # peak, quality.beats_across_gaps) drops the RR bridging rejected spans
+    def rr(self, peaks, fs=None, excluded=None):
+        return rr_series(peaks, fs or self.fs, excluded)
+
+    # Queryable beat list (beats.BeatSeries) with quality flags; `windows`
+    # from quality() flags the beats whose RR spans an excluded window
+    def beats(self, peaks, fs=None, t0=0.0, windows=None):
+        fs = fs or self.fs
+        excluded = None if windows is None else beats_across_gaps(peaks, fs, windows)
+        with self.profiler.stage('beats') as stage:
+            series = BeatSeries.from_peaks(peaks, fs, t0, excluded)
+            stage.output(series.beats)
+            return series
+
+    def hrv(self, peaks, duration=None, window_s=HRV_WINDOW, step_s=HRV_STEP, fs=None,
+            excluded=None):
+        with self.profiler.stage('hrv') as stage:
+            return stage.output(sliding_hrv(peaks, fs or self.fs, window_s, step_s,
+                                            t_end=duration, excluded=excluded))
+
+    # Per-window quality scores of a raw ECG lead (quality.assess)
+    def quality(self, ecg):
+        with self.profiler.stage('quality') as stage:
+            return stage.output(assess(ecg, self.fs))
+
+    # detail -> envelope -> threshold -> edges on the usable spans only;
+    # mav and thresholded stay zero over the excluded windows
+    def gated(self, ecg, windows):
+        mav = np.zeros(np.shape(ecg), dtype=self.dtype)
+        thresholded = np.zeros(np.shape(ecg), dtype=self.dtype)
+        peaks = []
+        for lo, a, b, hi in gate_segments(len(ecg), self.fs, windows):
+            envelope = self.envelope(self.detail(ecg[lo:hi]), inplace=True)
+            mav[a:b] = envelope[a - lo:b - lo]
+            above = self.threshold(envelope, out=envelope)
+            thresholded[a:b] = above[a - lo:b - lo]
+            p = self.edges(above) + lo
+            peaks.append(p[(p >= a) & (p < b)])
+        peaks = np.concatenate(peaks) if peaks else np.zeros(0, dtype=np.int64)
+        return mav, thresholded, peaks
+
+    # |detail| at the detection scale on the usable spans (zero elsewhere),
+    # the 'abs' stage of gated() for plotting
+    def gated_abs(self, ecg, windows):
+        out = np.zeros(np.shape(ecg), dtype=self.dtype)
+        for lo, a, b, hi in gate_segments(len(ecg), self.fs, windows):
+            out[a:b] = np.abs(self.detail(ecg[lo:hi])[a - lo:b - lo])
+        return out
+
+    # Signals recorded at source_fs -> the analysis rate (polyphase, chunked)
+    def resample(self, signals, source_fs):
+        with self.profiler.stage('resample', source_fs=source_fs) as stage:
+            return stage.output(resample(signals, source_fs, self.fs))
+
+    # Analysis-rate detections -> R-wave samples on the source-rate ECG
+    def refine(self, source_ecg, peaks, source_fs):
+        with self.profiler.stage('refine') as stage:
+            return stage.output(refine_peaks(source_ecg, peaks, self.fs, source_fs))
+
+    # resp at the analysis rate, peaks at `fs` (default: the analysis rate)
+    def respiration(self, resp, peaks, window_s=RESP_WINDOW, step_s=RESP_STEP, fs=None,
+                    excluded=None):
+        with self.profiler.stage('respiration') as stage:
+            return stage.output(respiration_analysis(resp, peaks, self.fs, window_s, step_s,
+                                                     beat_fs=fs, excluded=excluded))
+
+    # --- whole chain ---
+    # Raw ECG (and optionally raw RESP) to every intermediate result, keyed
+    # by stage name. With a source_fs other than fs the signals are first
+    # resampled to fs; the chain runs at fs and 'source_peaks' (R waves at
+    # the source rate) give beat_time, rr, beats and hrv at the source
+    # resolution. With gate=True 'quality' holds the window scores and
+    # 'excluded' the rejected spans as (start, end) seconds.
+    def run(self, ecg, resp=None, source_fs=None):
+        resampled = bool(source_fs) and source_fs != self.fs
+        source_ecg = ecg
+        if resampled:
+            ecg = self.resample(ecg, source_fs)
+            resp = None if resp is None else self.resample(resp, source_fs)
+        out = {'ecg': self.baseline(ecg)}
+        windows = None
+        if self.gate and np.ndim(ecg) == 1:
+            windows = out['quality'] = self.quality(ecg)
+            out['excluded'] = excluded_spans(windows)
+            out['mav'], out['thresholded'], out['peaks'] = self.gated(out['ecg'], windows)
+        else:
+            out['mav'] = self.envelope(self.detail(out['ecg']), inplace=True)
+            out['thresholded'] = self.threshold(out['mav'])
+            out['peaks'] = self.edges(out['thresholded'])
+        if np.ndim(ecg) == 1:
+            duration = np.shape(ecg)[-1] / self.fs
+            beats, beat_fs = out['peaks'], self.fs
+            if resampled:
+                beats = out['source_peaks'] = self.refine(source_ecg, out['peaks'], source_fs)
+                beat_fs = source_fs
+            out['beats'] = self.beats(beats, beat_fs, windows=windows)
+            # RR bridging an excluded span stays out of HRV and respiration
+            across = (out['beats'].beats['quality'] & QUALITY_EXCLUDED) != 0
+            out['beat_time'], out['rr'] = self.rr(beats, beat_fs, across)
+            out['hrv'] = self.hrv(beats, duration, min(HRV_WINDOW, duration), fs=beat_fs,
+                                  excluded=across)
+            if resp is not None:
+                out['resp'] = self.baseline(resp, RESP_BASELINE_WINDOW)
+                out['respiration'] = self.respiration(out['resp'], beats,
+                                                      min(RESP_WINDOW, duration), fs=beat_fs,
+                                                      excluded=across)
+        return out
+
+    # Recordings at another rate (detected from ElapsedTime) are resampled
+    def run_recording(self, rec, lead='II', resp='RESP'):
+        return self.run(rec[lead], rec[resp] if resp in rec.channels else None, rec.fs)
+
+    def run_file(self, path, lead='II', resp='RESP'):
+        with self.profiler.stage('load'):
+            rec = load_recording(path)
+        return self.run_recording(rec, lead, resp)
+
@@ -0,0 +1,81 @@
+import numpy as np
+
+BASE_BIN = 8
+LEVEL_FACTOR = 4
+
+
+# ===== Min/max pyramid ===== #
+# Level k holds the min and max of consecutive bins of BASE_BIN * 4^k
+# samples, built once (about N/4 extra values in total). view() returns at
+# most ~2 points per pixel for any time window, read from the coarsest level
+# that still has at least one bin per pixel, so drawing a 24 h series costs
+# the same as drawing 10 s.
+class MinMaxPyramid:
+    def __init__(self, values, time=None, fs=125, base_bin=BASE_BIN, factor=LEVEL_FACTOR):
+        self.values = np.asarray(values)
+        self.time = np.arange(len(self.values)) / fs if time is None else np.asarray(time)
+        self.bins = []
+        self.mins = []
+        self.maxs = []
+        size = step = base_bin
+        lo = hi = self.values
+        while len(lo) >= step:
+            m = len(lo) // step
+            lo = lo[:m * step].reshape(m, step).min(axis=1)
+            hi = hi[:m * step].reshape(m, step).max(axis=1)
+            self.bins.append(size)
+            self.mins.append(lo)
+            self.maxs.append(hi)
+            size *= factor
+            step = factor
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.mins + self.maxs)
+
+    def _index_range(self, t0, t1):
+        i0 = 0 if t0 is None else int(np.searchsorted(self.time, t0, side='left'))
+        i1 = len(self.values) if t1 is None else int(np.searchsorted(self.time, t1, side='right'))
+        return i0, max(i0, i1)
+
+    # (t, y) for the samples between t0 and t1 decimated to ~n_pixels columns
+    def view(self, t0=None, t1=None, n_pixels=2000):
+        i0, i1 = self._index_range(t0, t1)
+        per_pixel = (i1 - i0) / max(n_pixels, 1)
+        level = -1
+        for k, size in enumerate(self.bins):
+            if size <= per_pixel:
+                level = k
+        if level < 0:
+            return self.time[i0:i1], self.values[i0:i1]
+        size = self.bins[level]
+        b0, b1 = i0 // size, -(-i1 // size)
+        lo = self.mins[level][b0:b1]
+        hi = self.maxs[level][b0:b1]
+        starts = np.arange(b0, b0 + len(lo)) * size
+        # min and max of each bin at its first and middle sample time
+        t = np.empty(2 * len(lo))
+        y = np.empty(2 * len(lo), dtype=lo.dtype)
+        t[0::2] = self.time[starts]
+        t[1::2] = self.time[np.minimum(starts + size // 2, len(self.time) - 1)]
+        y[0::2] = lo
+        y[1::2] = hi
+        # samples after the last full bin of this level
+        tail = len(self.mins[level]) * size
+        if i1 > tail:
+            t = np.concatenate([t, self.time[max(i0, tail):i1]])
+            y = np.concatenate([y, self.values[max(i0, tail):i1]])
+        return t, y
+
+
+# Plot the visible part of a pyramid on a matplotlib axis
+def plot_view(ax, pyramid, t0=None, t1=None, n_pixels=2000, **kwargs):
+    t, y = pyramid.view(t0, t1, n_pixels)
+    line = ax.plot(t, y, **kwargs)
+    if t0 is not None or t1 is not None:
+        ax.set_xlim(t0 if t0 is not None else pyramid.time[0],
+                    t1 if t1 is not None else pyramid.time[-1])
+    return line
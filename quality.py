@@ -0,0 +1,137 @@
+import numpy as np
+
+# Fixed scoring windows and the per-window limits (ECG in mV)
+QUALITY_WINDOW = 2.0
+FLAT_STUCK = 0.5          # fraction of repeated samples (stuck / leads-off)
+FLAT_STD = 0.005          # mV
+CLIP_FRACTION = 0.1       # fraction of samples on the window's min/max plateau
+CLIP_TOL = 0.01           # plateau tolerance, relative to the window's range
+HF_CUTOFF = 40.0          # Hz; power above it is noise for ECG
+HF_RATIO = 0.2
+MIN_RANGE = 0.1           # mV peak-to-peak
+MAX_RANGE = 6.0
+# Context added around each usable span so the DWT/MAV edges settle
+GATE_MARGIN = 1.0
+
+# Window flags (bits); a window is usable when they are all clear
+BAD_FLAT = 1
+BAD_CLIP = 2
+BAD_NOISE = 4
+BAD_RANGE = 8
+
+quality_dtype = np.dtype([('start', np.float64), ('end', np.float64),
+                          ('stuck', np.float64), ('std', np.float64), ('clip', np.float64),
+                          ('hf', np.float64), ('range', np.float64), ('flags', np.uint8)])
+
+
+# (n_windows, w) view of non-overlapping windows; a trailing partial window
+# is scored as the last w samples
+def _windows(x, w):
+    n = len(x)
+    full = n // w
+    rows = x[:full * w].reshape(full, w)
+    starts = np.arange(full) * w
+    if n % w:
+        rows = np.vstack([rows, x[n - w:]]) if full else x[np.newaxis]
+        starts = np.append(starts, full * w)
+    return rows, starts
+
+
+# ===== Quality assessment ===== #
+# All windows in one pass: stuck-sample fraction and std (flat line /
+# leads off), fraction on the window's min/max plateaus (saturation; a
+# clean beat touches its extremes for a sample or two), share of power
+# above HF_CUTOFF from one batched rfft (EMG / motion noise) and
+# peak-to-peak range (leads off / gross motion).
+def assess(signal, fs=125, window_s=QUALITY_WINDOW):
+    x = np.asarray(signal, dtype=np.float64)
+    n = len(x)
+    w = max(2, int(round(window_s * fs)))
+    out = np.zeros(0 if n == 0 else -(-n // w), dtype=quality_dtype)
+    if n == 0:
+        return out
+    rows, starts = _windows(x, w)
+    out['start'] = starts / fs
+    out['end'] = np.minimum(starts + w, n) / fs
+
+    out['stuck'] = np.mean(np.diff(rows, axis=1) == 0, axis=1)
+    out['std'] = rows.std(axis=1)
+    lo, hi = rows.min(axis=1, keepdims=True), rows.max(axis=1, keepdims=True)
+    tol = CLIP_TOL * (hi - lo)
+    out['clip'] = np.mean((rows >= hi - tol) | (rows <= lo + tol), axis=1)
+    power = np.abs(np.fft.rfft(rows - rows.mean(axis=1, keepdims=True), axis=1))**2
+    f = np.fft.rfftfreq(rows.shape[1], 1 / fs)
+    total = power.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['hf'] = np.where(total > 0, power[:, f > HF_CUTOFF].sum(axis=1) / total, 0.0)
+    out['range'] = (hi - lo)[:, 0]
+
+    flags = np.zeros(len(out), dtype=np.uint8)
+    flags[(out['stuck'] > FLAT_STUCK) | (out['std'] < FLAT_STD)] |= BAD_FLAT
+    flags[out['clip'] > CLIP_FRACTION] |= BAD_CLIP
+    flags[out['hf'] > HF_RATIO] |= BAD_NOISE
+    flags[(out['range'] < MIN_RANGE) | (out['range'] > MAX_RANGE)] |= BAD_RANGE
+    out['flags'] = flags
+    return out
+
+
+# Runs of windows with the same usability as (n, 2) [start, end) in seconds
+def _runs(windows, good):
+    mask = (windows['flags'] == 0) == good
+    if not mask.any():
+        return np.zeros((0, 2))
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    first = np.flatnonzero(edges == 1)
+    last = np.flatnonzero(edges == -1) - 1
+    return np.column_stack([windows['start'][first], windows['end'][last]])
+
+
+def usable_spans(windows):
+    return _runs(windows, True)
+
+
+def excluded_spans(windows):
+    return _runs(windows, False)
+
+
+# ===== Gated detection ===== #
+# Usable spans as sample ranges (lo, a, b, hi): [a, b) is the span and
+# [lo, hi) the same widened by `margin_s` of context on both sides.
+# windows=None takes the whole record as usable; max_s splits long spans
+# into blocks of at most that length.
+def gate_segments(n, fs, windows, margin_s=GATE_MARGIN, max_s=None):
+    margin = int(round(margin_s * fs))
+    step = int(round(max_s * fs)) if max_s else n
+    spans = [(0, n / fs)] if windows is None else usable_spans(windows)
+    segments = []
+    for t0, t1 in spans:
+        start, stop = int(round(t0 * fs)), min(n, int(round(t1 * fs)))
+        for a in range(start, stop, max(step, 1)):
+            b = min(stop, a + step)
+            segments.append((max(0, a - margin), a, b, min(n, b + margin)))
+    return segments
+
+
+# Runs detect(segment) -> peak indices only on the usable spans (with
+# context); peaks that fall in the context are dropped, the rest are
+# shifted back to record indices.
+def gated_peaks(signal, fs, windows, detect, margin_s=GATE_MARGIN):
+    found = []
+    for lo, a, b, hi in gate_segments(len(signal), fs, windows, margin_s):
+        peaks = np.asarray(detect(signal[lo:hi]), dtype=np.int64) + lo
+        found.append(peaks[(peaks >= a) & (peaks < b)])
+    return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+
+# Beats whose RR interval reaches back over an excluded window (the RR
+# from the last beat before a gap to the first one after it is not real)
+def beats_across_gaps(peaks, fs, windows, window_s=QUALITY_WINDOW):
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) == 0 or len(windows) == 0:
+        return np.zeros(len(peaks), dtype=bool)
+    w = max(2, int(round(window_s * fs)))
+    bad = np.zeros(len(windows) + 1, dtype=np.int64)
+    np.cumsum(windows['flags'] != 0, out=bad[1:])
+    k = np.minimum(peaks // w, len(windows) - 1)
+    prev = np.concatenate([[k[0]], k[:-1]])
+    return (bad[k + 1] - bad[prev]) > 0
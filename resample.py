@@ -0,0 +1,183 @@
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+from loader import CHUNK_ROWS, Recording, estimate_fs, iter_chunks, read_header
+
+# Rate the qj kernels and detector defaults were designed for
+ANALYSIS_FS = 125
+# Filter half-length in samples of the slower of the two rates, and the
+# cutoff relative to its Nyquist frequency
+HALF_TAPS = 16
+ROLLOFF = 0.9
+KAISER_BETA = 8.0
+OUT_BLOCK = 8192          # outputs computed per gather (bounds outputs x taps)
+# R-wave search after a detection edge when refining peaks at the source rate
+REFINE_BEFORE = 0.03
+REFINE_AFTER = 0.15
+
+
+# ===== Polyphase filter ===== #
+# fs_out / fs_in as a reduced fraction up / down (whole-Hz rates)
+def rate_ratio(fs_in, fs_out):
+    fs_in, fs_out = int(round(fs_in)), int(round(fs_out))
+    k = gcd(fs_in, fs_out)
+    return fs_out // k, fs_in // k
+
+
+# Kaiser-windowed sinc low-pass at the upsampled rate, DC gain `up`
+# (zero-stuffing divides it by up). Returned as the (up, K) phase matrix
+# H[p, k] = h[p + k*up] plus the centre tap, so output m is a K-tap dot
+# product with the input ending at (m*down + centre) // up.
+@lru_cache(maxsize=32)
+def polyphase_filter(up, down, half_taps=HALF_TAPS):
+    span = max(up, down)
+    length = 2 * half_taps * span + 1
+    center = length // 2
+    fc = 0.5 * ROLLOFF / span
+    n = np.arange(length) - center
+    h = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(length, KAISER_BETA)
+    h *= up / h.sum()
+    k = -(-length // up)
+    padded = np.zeros(k * up)
+    padded[:length] = h
+    phases = padded.reshape(k, up).T.copy()
+    phases.setflags(write=False)
+    return phases, center
+
+
+# ===== Streaming resampler ===== #
+# Block-wise polyphase resampling along the last axis with the
+# process()/flush() interface of the streaming stages. Carries the last K
+# inputs; output m is centred on input time m * down / up, so the filter
+# delay is already compensated and flush() returns the outputs that need
+# the implicit zeros after the last sample (ceil(n * up / down) in total).
+class StreamingResampler:
+    def __init__(self, fs_in, fs_out, half_taps=HALF_TAPS):
+        self.fs_in = fs_in
+        self.fs_out = fs_out
+        self.up, self.down = rate_ratio(fs_in, fs_out)
+        self.phases, self.center = polyphase_filter(self.up, self.down, half_taps)
+        self.taps = self.phases.shape[1]
+        self._buf = None
+        self._start = -self.taps      # absolute input index of _buf[..., 0]
+        self._n_in = 0
+        self._m = 0
+
+    def _outputs(self, stop, limit=None):
+        # every m whose last input (m*down + center) // up is below `stop`
+        m_end = max(self._m, (stop * self.up - 1 - self.center) // self.down + 1)
+        if limit is not None:
+            m_end = min(m_end, limit)
+        outs = []
+        back = np.arange(self.taps)
+        for m0 in range(self._m, m_end, OUT_BLOCK):
+            m = np.arange(m0, min(m0 + OUT_BLOCK, m_end))
+            pos = m * self.down + self.center
+            last = pos // self.up - self._start
+            x = self._buf[..., last[:, np.newaxis] - back]
+            outs.append(np.einsum('...mk,mk->...m', x, self.phases[pos % self.up]))
+        self._m = max(self._m, m_end)
+        # keep what the next output still reaches back to
+        first = (self._m * self.down + self.center) // self.up - self.taps + 1
+        drop = min(max(0, first - self._start), self._buf.shape[-1])
+        self._buf = self._buf[..., drop:]
+        self._start += drop
+        if not outs:
+            return np.zeros(self._buf.shape[:-1] + (0,))
+        return np.concatenate(outs, axis=-1)
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if self._buf is None:
+            self._buf = np.zeros(block.shape[:-1] + (self.taps,))
+        self._buf = np.concatenate([self._buf, block], axis=-1)
+        self._n_in += block.shape[-1]
+        return self._outputs(self._n_in)
+
+    def flush(self):
+        if self._buf is None:
+            return np.zeros(0)
+        total = -(-self._n_in * self.up // self.down)
+        pad = self.center // self.up + self.taps + 1
+        self._buf = np.concatenate([self._buf, np.zeros(self._buf.shape[:-1] + (pad,))],
+                                   axis=-1)
+        return self._outputs(self._n_in + pad, limit=total)
+
+
+# Whole signal (samples,) or (channels, samples), fed in chunks so the
+# temporaries stay bounded for long records
+def resample(signal, fs_in, fs_out, chunk=CHUNK_ROWS):
+    if rate_ratio(fs_in, fs_out) == (1, 1):
+        return np.asarray(signal)
+    signal = np.asarray(signal)
+    resampler = StreamingResampler(fs_in, fs_out)
+    parts = [resampler.process(signal[..., s:s + chunk])
+             for s in range(0, signal.shape[-1], chunk)]
+    parts.append(resampler.flush())
+    return np.concatenate(parts, axis=-1)
+
+
+def _resampled_time(t0, n, fs_out):
+    return t0 + np.arange(n) / fs_out
+
+
+# ===== Ingestion ===== #
+# Recording at fs_out: every channel resampled (float32, like the loader)
+# and the time axis rebuilt from the first sample. fs_in is detected from
+# ElapsedTime when not given.
+def resample_recording(rec, fs_out=ANALYSIS_FS, fs_in=None, chunk=CHUNK_ROWS):
+    fs_in = fs_in or rec.fs
+    if fs_in is None or rate_ratio(fs_in, fs_out) == (1, 1):
+        return rec
+    names = list(rec.channels)
+    data = {c: resample(rec[c], fs_in, fs_out, chunk).astype(np.float32) for c in names}
+    n = len(data[names[0]]) if names else -(-len(rec) * fs_out // fs_in)
+    t0 = float(rec.time[0]) if len(rec) else 0.0
+    return Recording(_resampled_time(t0, n, fs_out), data, dict(rec.units), source=rec.source)
+
+
+# Text export straight to fs_out chunk by chunk, never holding the
+# source-rate channels in memory
+def load_resampled(path, fs_out=ANALYSIS_FS, channels=None, chunksize=CHUNK_ROWS):
+    _, units = read_header(path)
+    resamplers, parts, t0 = None, {}, None
+    for time_s, data in iter_chunks(path, channels, chunksize):
+        if not len(time_s):
+            continue
+        if resamplers is None:
+            t0 = float(time_s[0])
+            fs_in = estimate_fs(time_s)
+            resamplers = {c: StreamingResampler(fs_in, fs_out) for c in data}
+        for c, v in data.items():
+            parts.setdefault(c, []).append(resamplers[c].process(v).astype(np.float32))
+    if resamplers is None:
+        return Recording(np.zeros(0), {}, {}, source=path)
+    for c, r in resamplers.items():
+        parts[c].append(r.flush().astype(np.float32))
+    data = {c: np.concatenate(v) for c, v in parts.items()}
+    n = len(next(iter(data.values())))
+    return Recording(_resampled_time(t0, n, fs_out), data, {c: units.get(c, '') for c in data},
+                     source=path)
+
+
+# ===== Peak refinement ===== #
+# Detections at the analysis rate -> R-wave samples at the source rate:
+# each edge is mapped to the source grid and moved to the largest deviation
+# from the local median of the source ECG within [edge - REFINE_BEFORE,
+# edge + REFINE_AFTER] (the detection edge precedes the R wave). Edges
+# that land on the same R wave are merged. RR intervals from these keep the
+# source time resolution.
+def refine_peaks(signal, peaks, fs_analysis, fs_source, before=REFINE_BEFORE,
+                 after=REFINE_AFTER):
+    signal = np.asarray(signal)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) == 0 or len(signal) == 0:
+        return peaks
+    centre = np.round(peaks * (fs_source / fs_analysis)).astype(np.int64)
+    offsets = np.arange(-int(round(before * fs_source)), int(round(after * fs_source)) + 1)
+    idx = np.clip(centre[:, np.newaxis] + offsets, 0, len(signal) - 1)
+    seg = signal[idx].astype(np.float64)
+    deviation = np.abs(seg - np.median(seg, axis=1, keepdims=True))
+    return np.unique(idx[np.arange(len(peaks)), np.argmax(deviation, axis=1)])
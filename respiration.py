@@ -0,0 +1,146 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from hrv import MIN_BEATS, SPECTRUM_BATCH, rr_series
+
+# Respiration analysis defaults: 60 s windows every 10 s on a ~5 Hz copy of
+# the signal, breathing between 6 and 42 breaths/min
+RESP_WINDOW = 60.0
+RESP_STEP = 10.0
+ANALYSIS_FS = 5.0
+RATE_BAND = (0.1, 0.7)
+# Welch segments inside each window for the HR-respiration coherence
+COHERENCE_SEGMENT = 20.0
+ZERO_PAD = 8
+
+# One record per window; rate in breaths/min, coherence in [0, 1] and phase
+# (rad) of HR relative to respiration at the breathing frequency
+resp_dtype = np.dtype([('start', np.float64), ('rate', np.float64),
+                       ('coherence', np.float64), ('phase', np.float64)])
+
+
+# ===== Decimation ===== #
+# Block means of q = round(fs / target_fs) samples; respiration and the HR
+# series live below 1 Hz, so this keeps everything linear in the record
+# length while cutting the spectral work by q
+def decimate_mean(signal, fs, target_fs=ANALYSIS_FS):
+    q = max(1, int(round(fs / target_fs)))
+    signal = np.asarray(signal, dtype=np.float64)
+    n = len(signal) // q
+    return signal[:n * q].reshape(n, q).mean(axis=1), fs / q
+
+
+def _window_offsets(n, fs, window_s, step_s):
+    n_win = int(round(window_s * fs))
+    step = max(1, int(round(step_s * fs)))
+    if n < n_win:
+        return np.zeros(0, dtype=np.int64), n_win
+    return np.arange(0, n - n_win + 1, step), n_win
+
+
+def _detrended(seg, taper):
+    return (seg - seg.mean(axis=-1, keepdims=True)) * taper
+
+
+# ===== Respiratory rate ===== #
+# Dominant frequency in RATE_BAND of every window: one zero-padded rfft per
+# batch of windows, refined by parabolic interpolation between bins
+def _peak_frequency(spectra, freqs, band):
+    mask = (freqs >= band[0]) & (freqs <= band[1])
+    sub = spectra[:, mask]
+    k = np.argmax(sub, axis=1)
+    inner = (k > 0) & (k < sub.shape[1] - 1)
+    rows = np.arange(len(sub))
+    a = sub[rows, np.maximum(k - 1, 0)]
+    b = sub[rows, k]
+    c = sub[rows, np.minimum(k + 1, sub.shape[1] - 1)]
+    denom = a - 2 * b + c
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(inner & (denom != 0), 0.5 * (a - c) / denom, 0.0)
+    df = freqs[1] - freqs[0]
+    freq = freqs[mask][k] + shift * df
+    freq[sub.max(axis=1) <= 0] = np.nan
+    return freq
+
+
+def respiratory_rate(resp, fs=125, window_s=RESP_WINDOW, step_s=RESP_STEP, band=RATE_BAND,
+                     analysis_fs=ANALYSIS_FS):
+    x, dfs = decimate_mean(resp, fs, analysis_fs)
+    offsets, n_win = _window_offsets(len(x), dfs, window_s, step_s)
+    rate = np.full(len(offsets), np.nan)
+    if len(offsets) == 0:
+        return offsets / dfs, rate
+    views = sliding_window_view(x, n_win)
+    taper = np.hanning(n_win)
+    nfft = ZERO_PAD * n_win
+    freqs = np.fft.rfftfreq(nfft, 1 / dfs)
+    for b in range(0, len(offsets), SPECTRUM_BATCH):
+        seg = _detrended(views[offsets[b:b + SPECTRUM_BATCH]], taper)
+        power = np.abs(np.fft.rfft(seg, nfft, axis=1))**2
+        rate[b:b + SPECTRUM_BATCH] = 60 * _peak_frequency(power, freqs, band)
+    return offsets / dfs, rate
+
+
+# ===== HR-respiration coupling ===== #
+# Instantaneous HR (60 / RR) interpolated onto the decimated respiration
+# grid; in every window both series are split into half-overlapping
+# COHERENCE_SEGMENT pieces and the Welch magnitude-squared coherence and
+# cross-spectral phase are read at the window's breathing frequency (RSA).
+# Peaks are sample indices at beat_fs (default: fs, the RESP rate).
+def respiration_analysis(resp, peaks, fs=125, window_s=RESP_WINDOW, step_s=RESP_STEP,
+                         band=RATE_BAND, analysis_fs=ANALYSIS_FS,
+                         segment_s=COHERENCE_SEGMENT, min_beats=MIN_BEATS, beat_fs=None,
+                         excluded=None):
+    starts, rate = respiratory_rate(resp, fs, window_s, step_s, band, analysis_fs)
+    out = np.zeros(len(starts), dtype=resp_dtype)
+    out['start'] = starts
+    out['rate'] = rate
+    out['coherence'] = out['phase'] = np.nan
+    beat_t, rr = rr_series(peaks, beat_fs or fs, excluded)
+    if len(starts) == 0 or len(rr) < 2:
+        return out
+
+    x, dfs = decimate_mean(resp, fs, analysis_fs)
+    q = int(round(fs / dfs))
+    # decimated sample i is the mean of input samples [i*q, (i+1)*q)
+    grid = (np.arange(len(x)) * q + (q - 1) / 2) / fs
+    hr = np.interp(grid, beat_t, 60 / rr)
+
+    offsets, n_win = _window_offsets(len(x), dfs, window_s, step_s)
+    seg_len = min(n_win, int(round(segment_s * dfs)))
+    hop = max(1, seg_len // 2)
+    taper = np.hanning(seg_len)
+    freqs = np.fft.rfftfreq(seg_len, 1 / dfs)
+    x_views = sliding_window_view(x, n_win)
+    hr_views = sliding_window_view(hr, n_win)
+    coherence = np.full(len(offsets), np.nan)
+    phase = np.full(len(offsets), np.nan)
+    for b in range(0, len(offsets), SPECTRUM_BATCH):
+        idx = offsets[b:b + SPECTRUM_BATCH]
+        # (windows, segments, seg_len) strided pieces of each window
+        X = np.fft.rfft(_detrended(
+            sliding_window_view(x_views[idx], seg_len, axis=1)[:, ::hop], taper), axis=-1)
+        Y = np.fft.rfft(_detrended(
+            sliding_window_view(hr_views[idx], seg_len, axis=1)[:, ::hop], taper), axis=-1)
+        sxy = np.mean(np.conj(X) * Y, axis=1)
+        sxx = np.mean(np.abs(X)**2, axis=1)
+        syy = np.mean(np.abs(Y)**2, axis=1)
+        f_resp = rate[b:b + SPECTRUM_BATCH] / 60
+        ok = np.isfinite(f_resp)
+        k = np.zeros(len(idx), dtype=np.int64)
+        k[ok] = np.round(f_resp[ok] / freqs[1]).astype(np.int64)
+        rows = np.arange(len(idx))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            c = np.abs(sxy[rows, k])**2 / (sxx[rows, k] * syy[rows, k])
+        c[~ok] = np.nan
+        coherence[b:b + SPECTRUM_BATCH] = c
+        phase[b:b + SPECTRUM_BATCH] = np.where(ok, np.angle(sxy[rows, k]), np.nan)
+
+    counts = (np.searchsorted(beat_t, starts + window_s) - np.searchsorted(beat_t, starts))
+    # a single segment always gives coherence 1
+    bad = (counts < min_beats) | ((n_win - seg_len) // hop + 1 < 2)
+    coherence[bad] = np.nan
+    phase[bad] = np.nan
+    out['coherence'] = coherence
+    out['phase'] = phase
+    return out
@@ -0,0 +1,186 @@
+import numpy as np
+
+from dwt import get_engine
+
+# Detection defaults: DWT scale 3, MAV over ~170 ms at 125 Hz, fixed threshold
+DETECTION_SCALE = 3
+DEFAULT_WINDOW_SIZE = 21
+THRESHOLD_VALUE = 0.31
+
+
+# All stages below work on one signal (samples,) or on a block of leads
+# (channels, samples) along the last axis.
+
+# ===== BASELINE ===== #
+# Function to shift ECG data to baseline using polynomial regression
+def baseline_shift(ecg_data, degree):
+    # x on [-1, 1] keeps the fit well conditioned on long records
+    if np.ndim(ecg_data) == 2:
+        # one least-squares solve for all leads
+        data = np.asarray(ecg_data, dtype=np.float64)
+        x = np.linspace(-1, 1, data.shape[-1])
+        p = np.polyfit(x, data.T, degree)
+        return data - (np.vander(x, degree + 1) @ p).T
+    x = np.linspace(-1, 1, len(ecg_data))
+    # Fit polynomial of given degree to the data
+    p = np.polyfit(x, ecg_data, degree)
+    # Evaluate the polynomial
+    trend = np.polyval(p, x)
+    # Subtract the polynomial trend from the original data
+    baseline_corrected = ecg_data - trend
+    return baseline_corrected
+
+
+# ===== Absolute ===== #
+def absolute_signal(signal):
+    return np.abs(signal)
+
+
+# ===== MAV ===== #
+# Weights of the zero-lag moving average. Odd sizes are a plain box; an even
+# size W uses the centred 2xW average (half weight on both end taps, W + 1
+# taps) so it still has no lag instead of failing.
+def mav_weights(window_size):
+    if window_size < 1:
+        raise ValueError("Window size must be >= 1")
+    if window_size % 2 == 1:
+        return np.ones(window_size) / window_size
+    weights = np.ones(window_size + 1) / window_size
+    weights[[0, -1]] /= 2
+    return weights
+
+
+# Moving average of reflect-padded prefix sums, O(N) for any window size.
+# `pad` is how far the signal in `prefix` was padded on each side. The
+# prefix is always float64; `out` (e.g. a float32 buffer) receives the result.
+def _mav_from_prefix(prefix, n, pad, window_size, out=None):
+    half = window_size // 2
+    lo = pad - half
+    total = prefix[..., lo + window_size:lo + window_size + n] - prefix[..., lo:lo + n]
+    if window_size % 2 == 0:
+        total += (prefix[..., lo + window_size + 1:lo + window_size + 1 + n]
+                  - prefix[..., lo + 1:lo + 1 + n])
+        total /= 2
+    if out is None:
+        return total / window_size
+    return np.divide(total, window_size, out=out)
+
+
+def _reflect_prefix(signal, pad):
+    # Use reflect padding to reduce edge bias
+    signal = np.asarray(signal, dtype=np.float64)
+    widths = [(0, 0)] * (signal.ndim - 1) + [(pad, pad)]
+    padded = np.pad(signal, widths, mode='reflect')
+    prefix = np.zeros(padded.shape[:-1] + (padded.shape[-1] + 1,))
+    np.cumsum(padded, axis=-1, out=prefix[..., 1:])
+    return prefix
+
+
+def zero_lag_moving_average(signal, window_size, out=None):
+    if window_size < 1:
+        raise ValueError("Window size must be >= 1")
+    half_window = window_size // 2
+    prefix = _reflect_prefix(signal, half_window)
+    return _mav_from_prefix(prefix, np.shape(signal)[-1], half_window, window_size, out)
+
+
+# Prefix sums of one signal padded for the largest window, so the MAV for any
+# window size up to max_window is a single subtraction
+class MAVBank:
+    def __init__(self, signal, max_window=30):
+        self.n = np.shape(signal)[-1]
+        self.max_window = max_window
+        self.pad = max_window // 2
+        self.prefix = _reflect_prefix(signal, self.pad)
+
+    def get(self, window_size, out=None):
+        if not 1 <= window_size <= self.max_window:
+            raise ValueError(f"Window size must be in 1..{self.max_window}")
+        return _mav_from_prefix(self.prefix, self.n, self.pad, window_size, out)
+
+    # (len(window_sizes), [channels,] N) array with the MAV for every window size
+    def all(self, window_sizes=None):
+        if window_sizes is None:
+            window_sizes = range(1, self.max_window + 1)
+        return np.stack([self.get(w) for w in window_sizes])
+
+
+# ===== Thresholding ===== #
+# Function for thresholding; threshold_value may hold one value per lead.
+# `out` may be any buffer of the signal's shape (also the signal itself).
+def threshold_signal(signal, threshold_value, out=None):
+    threshold_value = np.asarray(threshold_value)
+    if threshold_value.ndim == 1:
+        threshold_value = threshold_value[:, np.newaxis]
+    above = signal > threshold_value
+    thresholded_signal = np.zeros_like(signal) if out is None else out
+    thresholded_signal[...] = 0
+    thresholded_signal[above] = 1.1
+    return thresholded_signal
+
+
+# ===== RR Interval ===== #
+# Edge sample indices; a (channels, samples) input gives one array per lead
+def detect_rising_edges(signal):
+    if np.ndim(signal) == 2:
+        lead, idx = np.nonzero(np.diff(signal, axis=-1) > 0)
+        return np.split(idx, np.searchsorted(lead, np.arange(1, len(signal))))
+    rising_edges = np.where(np.diff(signal) > 0)[0]
+    return rising_edges
+
+
+def detect_falling_edges(signal):
+    if np.ndim(signal) == 2:
+        lead, idx = np.nonzero(np.diff(signal, axis=-1) < 0)
+        return np.split(idx, np.searchsorted(lead, np.arange(1, len(signal))))
+    falling_edges = np.where(np.diff(signal) < 0)[0]
+    return falling_edges
+
+
+# DWT -> abs -> MAV -> threshold -> rising edges on baselined ECG lead(s)
+def detect_r_peaks(ecg, fs=125, scale=DETECTION_SCALE, window_size=DEFAULT_WINDOW_SIZE,
+                   threshold_value=THRESHOLD_VALUE):
+    dwt = get_engine([scale], fs, method="atrous").transform(ecg)
+    ecg_abs = absolute_signal(dwt[..., 0, :])
+    mav_ecg = zero_lag_moving_average(ecg_abs, window_size)
+    return detect_rising_edges(threshold_signal(mav_ecg, threshold_value))
+
+
+# ===== Multi-lead consensus ===== #
+# Peaks from all leads within `tolerance` seconds of each other form one
+# beat; a beat is kept when at least min_leads leads (default: majority)
+# found it and is placed at the median of its members. Returns the consensus
+# peaks and, per lead, the F1 agreement with them (1.0 = cleanest lead).
+def consensus_peaks(lead_peaks, fs=125, tolerance=0.1, min_leads=None):
+    n_leads = len(lead_peaks)
+    if min_leads is None:
+        min_leads = n_leads // 2 + 1
+    counts = np.array([len(p) for p in lead_peaks])
+    if counts.sum() == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(n_leads)
+    peaks = np.concatenate(lead_peaks).astype(np.int64)
+    leads = np.repeat(np.arange(n_leads), counts)
+    order = np.argsort(peaks, kind='stable')
+    peaks, leads = peaks[order], leads[order]
+
+    cluster = np.concatenate([[0], np.cumsum(np.diff(peaks) > tolerance * fs)])
+    # distinct leads per cluster
+    pairs = np.unique(cluster * n_leads + leads)
+    pair_cluster, pair_lead = pairs // n_leads, pairs % n_leads
+    n_clusters = cluster[-1] + 1
+    votes = np.bincount(pair_cluster, minlength=n_clusters)
+    keep = votes >= min_leads
+
+    # median position per kept cluster (peaks are sorted within a cluster)
+    starts = np.searchsorted(cluster, np.arange(n_clusters))
+    sizes = np.bincount(cluster, minlength=n_clusters)
+    lo = peaks[starts + (sizes - 1) // 2]
+    hi = peaks[starts + sizes // 2]
+    consensus = ((lo + hi) // 2)[keep]
+
+    matched = np.bincount(pair_lead[keep[pair_cluster]], minlength=n_leads)
+    precision = np.divide(matched, counts, out=np.zeros(n_leads), where=counts > 0)
+    recall = matched / max(len(consensus), 1)
+    agreement = np.divide(2 * precision * recall, precision + recall,
+                          out=np.zeros(n_leads), where=(precision + recall) > 0)
+    return consensus, agreement
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from cache import file_digest
+from loader import CHUNK_ROWS, Recording, estimate_fs, iter_chunks, load_recording, read_header
+
+META_FILE = 'meta.json'
+TIME_FILE = 'time.npy'
+STORE_VERSION = 1
+
+
+# ===== Columnar store ===== #
+# One directory per recording: time.npy (float64 seconds), one float32 .npy
+# per channel and meta.json (rows, fs, units, source digest). Arrays are
+# opened as read-only memory maps, so opening a 24 h recording reads only the
+# metadata and a [t0, t1) window is a zero-copy slice of each column.
+def _channel_file(name):
+    return f"{name}.npy"
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+# Stream a text export into `directory` chunk by chunk (never the whole file
+# in memory). Columns are appended to raw files first and given their .npy
+# header once the row count is known.
+def convert(path, directory, channels=None, chunksize=CHUNK_ROWS):
+    names, units = read_header(path)
+    channels = [c for c in names[1:] if c] if channels is None else list(channels)
+    os.makedirs(directory, exist_ok=True)
+    columns = [('time', np.float64)] + [(c, np.float32) for c in channels]
+    raw = {c: open(os.path.join(directory, _channel_file(c) + '.raw'), 'wb')
+           for c, _ in columns}
+    rows = 0
+    head = None
+    try:
+        for time_s, data in iter_chunks(path, channels, chunksize):
+            if head is None and len(time_s):
+                head = time_s[:100_000]
+            time_s.astype(np.float64).tofile(raw['time'])
+            for c in channels:
+                data[c].astype(np.float32).tofile(raw[c])
+            rows += len(time_s)
+    finally:
+        for f in raw.values():
+            f.close()
+
+    for c, dtype in columns:
+        src = os.path.join(directory, _channel_file(c) + '.raw')
+        dst = os.path.join(directory, TIME_FILE if c == 'time' else _channel_file(c))
+        with open(src, 'rb') as fin, open(dst + '.tmp', 'wb') as fout:
+            np.lib.format.write_array_header_1_0(fout, {'descr': np.dtype(dtype).str,
+                                                        'fortran_order': False,
+                                                        'shape': (rows,)})
+            shutil.copyfileobj(fin, fout, 1 << 22)
+        os.replace(dst + '.tmp', dst)
+        os.remove(src)
+
+    meta = {'version': STORE_VERSION, 'rows': rows, 'channels': channels,
+            'units': {c: units.get(c, '') for c in channels},
+            'fs': estimate_fs(head) if head is not None else None,
+            'source': os.path.abspath(path), 'digest': file_digest(path)}
+    # meta.json last: a directory without it is an unfinished conversion
+    with open(os.path.join(directory, META_FILE + '.tmp'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(os.path.join(directory, META_FILE + '.tmp'), os.path.join(directory, META_FILE))
+    return RecordingStore(directory)
+
+
+class RecordingStore:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.channels = self.meta['channels']
+        self.units = self.meta['units']
+        self.fs = self.meta['fs']
+        self._columns = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def _column(self, name):
+        if name not in self._columns:
+            path = os.path.join(self.directory,
+                                TIME_FILE if name == 'time' else _channel_file(name))
+            self._columns[name] = np.load(path, mmap_mode='r')
+        return self._columns[name]
+
+    @property
+    def time(self):
+        return self._column('time')
+
+    def __getitem__(self, name):
+        if name not in self.channels:
+            raise KeyError(name)
+        return self._column(name)
+
+    @property
+    def duration(self):
+        t = self.time
+        return float(t[-1] - t[0]) if len(t) else 0.0
+
+    # True when the store was made from the current contents of its source
+    def is_current(self, path=None):
+        path = path or self.meta['source']
+        return os.path.exists(path) and file_digest(path) == self.meta['digest']
+
+    # Row range [i0, i1) of the samples with t0 <= time < t1 (binary search
+    # on the memory-mapped time column, a few pages touched)
+    def index(self, t0=None, t1=None):
+        t = self.time
+        i0 = 0 if t0 is None else int(np.searchsorted(t, t0, side='left'))
+        i1 = len(t) if t1 is None else int(np.searchsorted(t, t1, side='left'))
+        return i0, max(i0, i1)
+
+    # Recording of [t0, t1) whose arrays are views into the memory maps
+    def window(self, t0=None, t1=None, channels=None):
+        i0, i1 = self.index(t0, t1)
+        channels = self.channels if channels is None else list(channels)
+        data = {c: self[c][i0:i1] for c in channels}
+        return Recording(self.time[i0:i1], data, {c: self.units.get(c, '') for c in channels},
+                         source=self.directory)
+
+
+# Store for `path` under store_dir, converted on first use or when the
+# source file changed
+def store_for(path, store_dir, channels=None):
+    directory = os.path.join(store_dir, file_digest(path))
+    if not is_store(directory):
+        return convert(path, directory, channels)
+    return RecordingStore(directory)
+
+
+# A store directory or a text export, as a Recording
+def open_recording(path, channels=None):
+    if is_store(path):
+        return RecordingStore(path).window(channels=channels)
+    return load_recording(path, channels=channels)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert monitor text exports to .npy stores")
+    sub = parser.add_subparsers(dest='command', required=True)
+    conv = sub.add_parser('convert', help="text export -> store directory")
+    conv.add_argument('input')
+    conv.add_argument('-o', '--output', required=True, help="store directory")
+    conv.add_argument('--channels', nargs='+')
+    info = sub.add_parser('info', help="show a store's metadata")
+    info.add_argument('store')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        store = convert(args.input, args.output, args.channels)
+        print(f"{len(store)} rows, {store.duration:.1f} s, fs={store.fs} -> {args.output}",
+              file=sys.stderr)
+    else:
+        print(json.dumps(RecordingStore(args.store).meta, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import numpy as np
+
+from stages import DEFAULT_WINDOW_SIZE, DETECTION_SCALE, THRESHOLD_VALUE, mav_weights
+from wavelet import kernel_bank, same_center
+
+# One record per detected R-peak; rr/hr are NaN for the first beat
+beat_dtype = np.dtype([('index', np.int64), ('time', np.float64),
+                       ('rr', np.float64), ('hr', np.float64)])
+
+_empty = np.zeros(0)
+
+
+# ===== Streaming DWT ===== #
+# FIR with the qj kernel, carrying the last len(kernel) - 1 inputs between
+# blocks. Output sample n needs input up to n + center, so it lags by
+# `latency` samples; flush() feeds the implicit zeros after the last sample.
+class StreamingDWT:
+    def __init__(self, scale=DETECTION_SCALE, fs=125):
+        self.kernel = kernel_bank.kernel(scale, fs)
+        self.latency = same_center(scale)
+        self._tail = np.zeros(len(self.kernel) - 1)
+        self._skip = self.latency
+        self._n_in = 0
+        self._n_out = 0
+
+    def _run(self, block):
+        if len(block) == 0:
+            return _empty
+        ext = np.concatenate([self._tail, block])
+        y = np.convolve(ext, self.kernel, mode='valid')
+        self._tail = ext[len(ext) - len(self._tail):]
+        drop = min(self._skip, len(y))
+        self._skip -= drop
+        return y[drop:]
+
+    def process(self, block):
+        block = np.asarray(block, dtype=float)
+        self._n_in += len(block)
+        y = self._run(block)
+        self._n_out += len(y)
+        return y
+
+    def flush(self):
+        y = self._run(np.zeros(self.latency))[:self._n_in - self._n_out]
+        self._n_out += len(y)
+        return y
+
+
+# ===== Streaming MAV ===== #
+# Zero-lag moving average with the same reflect padding as
+# zero_lag_moving_average(). The head reflection waits for the first
+# half_window + 1 samples, the tail reflection is added by flush().
+class StreamingMAV:
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE):
+        self.window_size = window_size
+        self.weights = mav_weights(window_size)
+        self.latency = len(self.weights) // 2
+        self._head = []
+        self._started = False
+        self._tail = _empty
+
+    def _run(self, padded):
+        ext = np.concatenate([self._tail, padded])
+        if len(ext) < len(self.weights):
+            self._tail = ext
+            return _empty
+        y = np.convolve(ext, self.weights, mode='valid')
+        self._tail = ext[len(ext) - len(self.weights) + 1:]
+        return y
+
+    def process(self, block):
+        block = np.asarray(block, dtype=float)
+        if self._started:
+            return self._run(block)
+        self._head.append(block)
+        head = np.concatenate(self._head)
+        if len(head) <= self.latency:
+            return _empty
+        self._started = True
+        self._head = []
+        return self._run(np.concatenate([head[self.latency:0:-1], head]))
+
+    def flush(self):
+        if not self._started:
+            # record shorter than the window: fall back to np.pad semantics
+            head = np.concatenate(self._head) if self._head else _empty
+            if len(head) == 0:
+                return _empty
+            padded = np.pad(head, self.latency, mode='reflect')
+            return np.convolve(padded, self.weights, mode='valid')
+        # last latency + 1 raw samples are the end of the carried tail
+        last = self._tail[len(self._tail) - self.latency - 1:]
+        return self._run(last[-2::-1] if self.latency else _empty)
+
+
+# ===== Streaming edge detector ===== #
+# Rising edges of the thresholded MAV, carrying the previous sample value
+class StreamingEdges:
+    def __init__(self, threshold_value=THRESHOLD_VALUE):
+        self.threshold_value = threshold_value
+        self._prev = None
+        self._n = 0
+
+    def process(self, mav):
+        above = np.asarray(mav) > self.threshold_value
+        start = self._n
+        self._n += len(above)
+        if self._prev is not None:
+            above = np.concatenate([[self._prev], above])
+            start -= 1
+        if len(above) == 0:
+            return np.zeros(0, dtype=np.int64)
+        self._prev = above[-1]
+        return start + np.nonzero(np.diff(above.astype(np.int8)) > 0)[0]
+
+
+# ===== Streaming detector ===== #
+# Block-wise R-peak detector: DWT -> abs -> MAV -> threshold -> edges -> RR.
+# State is fixed-size (kernel tail, MAV window, last edge, running RR sums),
+# so memory does not grow with session length. A peak is reported at most
+# `latency` samples after it arrives. `baseline` is an optional stage with
+# the same process()/flush() interface run before the DWT; the whole-record
+# polyfit of baseline_shift() cannot be computed causally, so without one
+# the input is expected to be baselined already.
+class StreamingDetector:
+    def __init__(self, fs=125, scale=DETECTION_SCALE, window_size=DEFAULT_WINDOW_SIZE,
+                 threshold_value=THRESHOLD_VALUE, baseline=None):
+        self.fs = fs
+        self.baseline = baseline
+        self.dwt = StreamingDWT(scale, fs)
+        self.mav = StreamingMAV(window_size)
+        self.edges = StreamingEdges(threshold_value)
+        self.latency = self.dwt.latency + self.mav.latency + 1
+        if baseline is not None:
+            self.latency += getattr(baseline, 'latency', 0)
+        self._last_peak = None
+        self._rr_sum = 0.0
+        self._rr_count = 0
+        self.heart_rate = np.nan
+
+    @property
+    def mean_rr(self):
+        return self._rr_sum / self._rr_count if self._rr_count else np.nan
+
+    def _beats(self, peaks):
+        beats = np.zeros(len(peaks), dtype=beat_dtype)
+        if len(peaks) == 0:
+            return beats
+        prev = np.concatenate([[-1 if self._last_peak is None else self._last_peak], peaks[:-1]])
+        rr = (peaks - prev) / self.fs
+        if self._last_peak is None:
+            rr[0] = np.nan
+        beats['index'] = peaks
+        beats['time'] = peaks / self.fs
+        beats['rr'] = rr
+        beats['hr'] = 60 / rr
+        valid = rr[~np.isnan(rr)]
+        self._rr_sum += valid.sum()
+        self._rr_count += len(valid)
+        self._last_peak = peaks[-1]
+        if self._rr_count:
+            self.heart_rate = 60 / self.mean_rr
+        return beats
+
+    def process(self, block):
+        if self.baseline is not None:
+            block = self.baseline.process(block)
+        y = self.dwt.process(block)
+        mav = self.mav.process(np.abs(y))
+        return self._beats(self.edges.process(mav))
+
+    def flush(self):
+        if self.baseline is not None:
+            y = self.dwt.process(self.baseline.flush())
+            y = np.concatenate([y, self.dwt.flush()])
+        else:
+            y = self.dwt.flush()
+        mav = np.concatenate([self.mav.process(np.abs(y)), self.mav.flush()])
+        return self._beats(self.edges.process(mav))
+
+
+# Feed a recorded signal through the detector block by block
+def run_stream(signal, block_size=125, **kwargs):
+    detector = StreamingDetector(**kwargs)
+    signal = np.asarray(signal, dtype=float)
+    beats = [detector.process(signal[s:s + block_size])
+             for s in range(0, len(signal), block_size)]
+    beats.append(detector.flush())
+    return np.concatenate(beats)
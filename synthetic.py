@@ -0,0 +1,89 @@
+import numpy as np
+
+from loader import Recording, column_names
+
+# PQRST as (offset from R in s, width in s, amplitude in mV) Gaussians
+ECG_WAVES = ((-0.20, 0.025, 0.12), (-0.03, 0.010, -0.15), (0.0, 0.012, 1.0),
+             (0.03, 0.010, -0.25), (0.25, 0.045, 0.30))
+UNITS = {'RESP': 'pm', 'PLETH': 'NU', 'V': 'mV', 'AVR': 'mV', 'II': 'mV'}
+
+
+# ===== Synthetic ECG/RESP ===== #
+# Deterministic for a given seed. Beats follow hr (BPM) with respiratory
+# sinus arrhythmia at resp_rate (breaths/min) plus small random RR jitter;
+# ECG leads get baseline wander and white noise of std `noise` (mV).
+# Returns the Recording (float32 channels, like load_recording) and the true
+# R-peak sample indices.
+def beat_template(fs):
+    half = int(round(0.35 * fs))
+    k = np.arange(-half, half + 1) / fs
+    wave = np.zeros(len(k))
+    for offset, width, amp in ECG_WAVES:
+        wave += amp * np.exp(-0.5 * ((k - offset) / width)**2)
+    return wave, half
+
+
+def synthetic_recording(duration_s=10.0, fs=125, noise=0.02, hr=72.0, resp_rate=15.0,
+                        rsa=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(round(duration_s * fs))
+    t = np.arange(n) / fs
+    f_resp = resp_rate / 60
+    resp_phase = 2 * np.pi * f_resp * t + rng.uniform(0, 2 * np.pi)
+
+    # beats: integrate the instantaneous rate and take each whole cycle
+    rate = hr / 60 * (1 + rsa * np.sin(resp_phase))
+    cycles = np.cumsum(rate) / fs + rng.uniform(0, 1)
+    peaks = np.flatnonzero(np.diff(np.floor(cycles))) + 1
+    jitter = np.round(rng.normal(0, 0.01 * fs, len(peaks))).astype(np.int64)
+    peaks = np.unique(np.clip(peaks + jitter, 0, n - 1))
+
+    impulses = np.zeros(n)
+    impulses[peaks] = 1
+    wave, half = beat_template(fs)
+    ecg = np.convolve(impulses, wave)[half:half + n]
+    wander = 0.15 * np.sin(2 * np.pi * 0.05 * t) + 0.1 * np.sin(resp_phase)
+
+    def lead(gain):
+        return (gain * ecg + wander + rng.normal(0, noise, n)).astype(np.float32)
+
+    resp = (np.sin(resp_phase) + 0.2 * np.sin(2 * np.pi * 0.01 * t)
+            + rng.normal(0, noise, n)).astype(np.float32)
+    pleth = (0.5 + 0.3 * np.sin(2 * np.pi * np.cumsum(rate) / fs)).astype(np.float32)
+    channels = {'RESP': resp, 'PLETH': pleth, 'V': lead(0.8), 'AVR': lead(-0.5),
+                'II': lead(1.0)}
+    return Recording(t, channels, dict(UNITS), source='synthetic'), peaks
+
+
+# ===== Text export ===== #
+# Same layout as the monitor export (two header lines, tab separated,
+# [h:]mm:ss.mmm elapsed time), so the loader can be exercised on any length
+def format_elapsed_time(seconds):
+    # pandas is only needed for the text export, so the generator stays numpy-only
+    import pandas as pd
+
+    ms = np.round(np.asarray(seconds) * 1000).astype(np.int64)
+    hours, rest = np.divmod(ms, 3_600_000)
+    minutes, rest = np.divmod(rest, 60_000)
+    secs, millis = np.divmod(rest, 1000)
+    mmss = (pd.Series(minutes).astype(str).str.zfill(2) + ':'
+            + pd.Series(secs).astype(str).str.zfill(2) + '.'
+            + pd.Series(millis).astype(str).str.zfill(3))
+    with_hours = pd.Series(hours).astype(str) + ':' + mmss
+    short = pd.Series(minutes).astype(str) + mmss.str[2:]
+    return np.where(hours > 0, with_hours, short)
+
+
+def write_export(path, rec):
+    import pandas as pd
+
+    names = column_names
+    header = f"{names[0]:>14}" + ''.join(f"\t{name + ',':>6} " for name in names[1:])
+    units = '\t'.join([f"{'hh:mm:ss.mmm':>15}"] + [f"{'(' + rec.units.get(c, '') + ')':>7}"
+                                                    for c in names[1:]])
+    df = pd.DataFrame({c: rec[c] for c in names[1:]})
+    df.insert(0, names[0], pd.Series(format_elapsed_time(rec.time)).str.rjust(15))
+    with open(path, 'w', newline='') as f:
+        f.write(header + '\r\n' + units + '\r\n')
+        df.to_csv(f, sep='\t', header=False, index=False, float_format='%7.3f',
+                  lineterminator='\r\n')
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+
+# ===== Filter koef ===== #
+# Quadratic spline wavelet filters, taps for n = -2..1
+# h[n] = 1/8 * (d(n-1) + 3d(n) + 3d(n+1) + d(n+2))
+# g[n] = -2 * (d(n) - d(n+1))
+h = np.array([1, 3, 3, 1]) / 8
+g = np.array([0, 2, -2, 0], dtype=float)
+filter_n = np.arange(-2, 2)
+
+
+# Insert (factor - 1) zeros between the taps of a filter
+def upsample_filter(taps, factor):
+    up = np.zeros((len(taps) - 1) * factor + 1)
+    up[::factor] = taps
+    return up
+
+
+# Support [a, b) of qj in k, same bounds as the original per-scale loops
+def scale_support(j):
+    a = -(2**j + 2**(j - 1) - 2)
+    b = 2**(j - 1)
+    return a, b
+
+
+# Length the original script padded kernel_jN to (k_list kept growing over
+# the scales), which fixes where mode='same' puts the output
+def legacy_kernel_length(j):
+    return 2**(j + 2) - 4 - 2 * j
+
+
+# Index into the qj taps that lines up with output sample n
+def same_center(j):
+    return (legacy_kernel_length(j) - 1) // 2
+
+
+# ===== qj impulse response ===== #
+# Mallat: qj = g(2^(j-1) n) * h(2^(j-2) n) * ... * h(n)
+def qj_kernel(j):
+    if j < 1:
+        raise ValueError("Scale j must be >= 1")
+    q = upsample_filter(g, 2**(j - 1))
+    for k in range(j - 1):
+        q = np.convolve(q, upsample_filter(h, 2**k))
+    # q starts at k = -(2^(j+1) - 2); keep only the non-zero support [a, b)
+    a, b = scale_support(j)
+    start = 2**(j - 1)
+    return q[start:start + (b - a)]
+
+
+# ===== Kernel bank ===== #
+# Memoized qj kernels keyed by (fs, j). The taps only depend on j; fs is
+# part of the key so banks for different analysis rates stay separate, also
+# on disk (one .npz per fs in cache_dir).
+class KernelBank:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._kernels = {}
+        self._loaded = set()
+
+    def _path(self, fs):
+        return os.path.join(self.cache_dir, f"qj_fs{fs}.npz")
+
+    def _load(self, fs):
+        self._loaded.add(fs)
+        if self.cache_dir is None or not os.path.exists(self._path(fs)):
+            return
+        with np.load(self._path(fs)) as data:
+            for name in data.files:
+                self._kernels[(fs, int(name[1:]))] = data[name]
+
+    def save(self, fs):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays = {f"j{j}": q for (f, j), q in self._kernels.items() if f == fs}
+        np.savez(self._path(fs), **arrays)
+
+    def kernel(self, j, fs=125):
+        key = (fs, j)
+        if key not in self._kernels and fs not in self._loaded:
+            self._load(fs)
+        if key not in self._kernels:
+            q = qj_kernel(j)
+            q.setflags(write=False)
+            self._kernels[key] = q
+            self.save(fs)
+        return self._kernels[key]
+
+    def kernels(self, scales, fs=125):
+        return [self.kernel(j, fs) for j in scales]
+
+    def clear(self):
+        self._kernels.clear()
+        self._loaded.clear()
+
+
+kernel_bank = KernelBank(cache_dir=os.environ.get("HRVRESP_KERNEL_CACHE"))
+
+
+# ===== Konvolusi skala ===== #
+# Same result as np.convolve(signal, kernel_jN, mode='same') on the
+# original zero-padded kernels, always len(signal) samples long
+def dwt_scale(signal, j, fs=125, bank=None):
+    bank = kernel_bank if bank is None else bank
+    signal = np.asarray(signal, dtype=float)
+    full = np.convolve(signal, bank.kernel(j, fs))
+    c = same_center(j)
+    out = np.zeros(len(signal))
+    seg = full[c:c + len(signal)]
+    out[:len(seg)] = seg
+    return out
@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from baseline import ECG_BASELINE_WINDOW, RESP_BASELINE_WINDOW
+from beats import QUALITY_EXCLUDED
+from hrv import HRV_WINDOW
+from loader import CHUNK_ROWS, Recording, iter_chunks, read_header
+from pipeline import Pipeline
+from quality import excluded_spans, gate_segments
+from resample import ANALYSIS_FS, StreamingResampler, rate_ratio
+from respiration import RESP_WINDOW
+from stages import DEFAULT_WINDOW_SIZE, THRESHOLD_VALUE
+from store import is_store, open_recording, store_for
+
+# Detection runs in blocks of this many seconds (plus GATE_MARGIN of
+# context), with a progress report and a cancellation point after each
+DETECT_BLOCK = 600.0
+# Share of the overall progress bar per stage of analyse()
+STAGE_WEIGHTS = {'load': 0.3, 'resample': 0.1, 'quality': 0.05, 'baseline': 0.1,
+                 'detect': 0.35, 'beats': 0.02, 'hrv': 0.04, 'respiration': 0.04}
+
+
+class Cancelled(Exception):
+    pass
+
+
+# ===== Job ===== #
+# One pipeline run on a daemon thread. The target calls report() between
+# pieces of work (which raises Cancelled once cancel() was called) and
+# publish() for results as soon as they exist; the dashboard polls
+# snapshot() and draws whatever is there. numpy releases the GIL in the
+# heavy loops, so the script thread stays responsive.
+class Job:
+    def __init__(self, key, target, *args, **kwargs):
+        self.key = key
+        self.status = 'pending'
+        self.stage = None
+        self.progress = 0.0
+        self.stages = []          # {'stage', 'seconds'} per stage, in order
+        self.results = {}
+        self.error = None
+        self.target, self.args, self.kwargs = target, args, kwargs
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._stage_start = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.status = 'running'
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.target(self, *self.args, **self.kwargs)
+            status = 'done'
+        except Cancelled:
+            status = 'cancelled'
+        except Exception as exc:
+            self.error = f"{type(exc).__name__}: {exc}"
+            status = 'error'
+        with self._lock:
+            self._close_stage()
+            if status == 'done':
+                self.progress = 1.0
+            self.status = status
+
+    def _close_stage(self):
+        if self.stage is not None and self._stage_start is not None:
+            self.stages.append({'stage': self.stage,
+                                'seconds': time.perf_counter() - self._stage_start})
+        self._stage_start = None
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'cancelled', 'error')
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    # Enter `stage` (timing the previous one) and set the overall progress
+    # in [0, 1]; also a cancellation point
+    def report(self, stage, progress):
+        self.check()
+        with self._lock:
+            if stage != self.stage:
+                self._close_stage()
+                self.stage = stage
+                self._stage_start = time.perf_counter()
+            self.progress = min(max(progress, 0.0), 1.0)
+
+    def publish(self, **results):
+        with self._lock:
+            self.results.update(results)
+
+    # Consistent copy of the state for drawing
+    def snapshot(self):
+        with self._lock:
+            stages = list(self.stages)
+            if self._stage_start is not None:
+                stages.append({'stage': self.stage,
+                               'seconds': time.perf_counter() - self._stage_start})
+            return {'status': self.status, 'stage': self.stage, 'progress': self.progress,
+                    'stages': stages, 'results': dict(self.results), 'error': self.error}
+
+    def wait(self, timeout=None):
+        if self.status != 'pending':
+            self._thread.join(timeout)
+        return self.finished
+
+
+# ===== Job manager ===== #
+# At most one live job: submitting a new key cancels the previous run, so a
+# parameter change never queues another full pass behind a stale one.
+# Submitting the current key again returns the current job in whatever
+# state it is; restart() runs it again from the start.
+class JobManager:
+    def __init__(self):
+        self.job = None
+
+    def submit(self, key, target, *args, **kwargs):
+        if self.job is not None and self.job.key == key:
+            return self.job
+        self.cancel()
+        self.job = Job(key, target, *args, **kwargs).start()
+        return self.job
+
+    def restart(self):
+        old = self.job
+        self.cancel()
+        self.job = Job(old.key, old.target, *old.args, **old.kwargs).start()
+        return self.job
+
+    def cancel(self):
+        if self.job is not None and not self.job.finished:
+            self.job.cancel()
+
+
+# Overall progress at `fraction` of `stage`
+def _progress(stage, fraction=0.0):
+    done = 0.0
+    for name, weight in STAGE_WEIGHTS.items():
+        if name == stage:
+            return done + weight * fraction
+        done += weight
+    return done
+
+
+# Row count of a text export from the size of its first MB (for progress)
+def _estimate_rows(path):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(1 << 20)
+    lines = head.count(b'\n')
+    return max(1, int(size * lines / max(len(head), 1)))
+
+
+# Text export chunk by chunk, reporting progress and honouring cancellation
+# between chunks. Store directories open as memory maps; with store_dir the
+# export is converted there first (store.store_for, all `store_channels`).
+def _load(job, path, channels, store_dir=None, store_channels=None):
+    if is_store(path) or store_dir:
+        job.report('load', _progress('load'))
+        if is_store(path):
+            return open_recording(path, channels)
+        return store_for(path, store_dir, store_channels).window(channels=channels)
+    _, units = read_header(path)
+    total = _estimate_rows(path)
+    times, parts, rows = [], {}, 0
+    for time_s, data in iter_chunks(path, channels, CHUNK_ROWS):
+        times.append(time_s)
+        for c, v in data.items():
+            parts.setdefault(c, []).append(v)
+        rows += len(time_s)
+        job.report('load', _progress('load', min(rows / total, 1.0)))
+    time_s = np.concatenate(times) if times else np.zeros(0)
+    data = {c: np.concatenate(v) for c, v in parts.items()}
+    return Recording(time_s, data, {c: units.get(c, '') for c in data}, source=path)
+
+
+# Channels to fs_out block by block (resample.StreamingResampler), with a
+# cancellation point per block
+def _resample(job, signals, fs_in, fs_out):
+    signals = np.asarray(signals)
+    resampler = StreamingResampler(fs_in, fs_out)
+    n = signals.shape[-1]
+    parts = []
+    for s in range(0, n, CHUNK_ROWS):
+        parts.append(resampler.process(signals[..., s:s + CHUNK_ROWS]).astype(np.float32))
+        job.report('resample', _progress('resample', min((s + CHUNK_ROWS) / n, 1.0)))
+    parts.append(resampler.flush().astype(np.float32))
+    return np.concatenate(parts, axis=-1)
+
+
+# ===== Background analysis ===== #
+# The dashboard chain on a whole recording inside a Job: load -> resample
+# -> quality -> baseline -> detection in DETECT_BLOCK blocks -> beats ->
+# HRV -> respiration. Results are published per stage: 'excluded' after
+# quality, 'peaks' (analysis rate, growing) after every detection block,
+# then 'beats', 'hrv' and 'respiration'. analysis_fs=None analyses at
+# ANALYSIS_FS or the source rate when that is lower.
+def analyse(job, path, lead='II', resp='RESP', analysis_fs=None, baseline='median',
+            dtype='float64', window_size=DEFAULT_WINDOW_SIZE, threshold_value=THRESHOLD_VALUE,
+            gate=True, block_s=DETECT_BLOCK, store_dir=None, store_channels=None):
+    rec = _load(job, path, [lead, resp], store_dir, store_channels)
+    source_fs = rec.fs
+    fs = analysis_fs or (ANALYSIS_FS if source_fs and source_fs > ANALYSIS_FS else source_fs)
+    job.publish(source_fs=source_fs, fs=fs, samples=len(rec))
+
+    source_ecg = np.asarray(rec[lead])
+    ecg, resp_raw = source_ecg, np.asarray(rec[resp])
+    if rate_ratio(source_fs, fs) != (1, 1):
+        ecg, resp_raw = _resample(job, np.vstack([source_ecg, resp_raw]), source_fs, fs)
+    duration = len(ecg) / fs
+    job.publish(duration=duration)
+
+    pipe = Pipeline(fs, baseline, dtype=dtype, window_size=window_size,
+                    threshold_value=threshold_value, gate=gate)
+    windows = None
+    if gate:
+        job.report('quality', _progress('quality'))
+        windows = pipe.quality(ecg)
+        job.publish(quality=windows, excluded=excluded_spans(windows))
+
+    job.report('baseline', _progress('baseline'))
+    ecg = pipe.baseline(ecg, ECG_BASELINE_WINDOW)
+
+    # gate_segments with windows=None covers the whole record
+    segments = gate_segments(len(ecg), fs, windows, max_s=block_s)
+    found = []
+    for k, (lo, a, b, hi) in enumerate(segments):
+        job.report('detect', _progress('detect', k / len(segments)))
+        p = pipe.peaks(ecg[lo:hi]) + lo
+        found.append(p[(p >= a) & (p < b)])
+        job.publish(peaks=np.concatenate(found))
+    peaks = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+    job.publish(peaks=peaks)
+
+    job.report('beats', _progress('beats'))
+    beats, beat_fs = peaks, fs
+    if fs != source_fs:
+        beats, beat_fs = pipe.refine(source_ecg, peaks, source_fs), source_fs
+    series = pipe.beats(beats, beat_fs, windows=windows)
+    job.publish(beats=series)
+    # RR bridging an excluded span stays out of HRV and respiration
+    across = (series.beats['quality'] & QUALITY_EXCLUDED) != 0
+
+    job.report('hrv', _progress('hrv'))
+    job.publish(hrv=pipe.hrv(beats, duration, min(HRV_WINDOW, duration), fs=beat_fs,
+                             excluded=across))
+
+    job.report('respiration', _progress('respiration'))
+    resp_base = pipe.baseline(resp_raw, RESP_BASELINE_WINDOW)
+    job.publish(respiration=pipe.respiration(resp_base, beats, min(RESP_WINDOW, duration),
+                                             fs=beat_fs, excluded=across))
+    job.report('respiration', 1.0)